@@ -0,0 +1,119 @@
+import json
+import os
+import platform
+import time
+
+import pytest
+
+from servers import Link, s3_server, swift_server
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-output",
+        default="benchmark.json",
+        help="file the benchmark results are written to",
+    )
+    parser.addoption(
+        "--bench-sizes",
+        default="100KB,10MB,100MB",
+        help="comma separated report sizes, e.g. 100KB,10MB,1GB",
+    )
+    parser.addoption(
+        "--bench-concurrency",
+        default="1,4,8",
+        help="comma separated upload concurrencies",
+    )
+    parser.addoption(
+        "--bench-latency",
+        type=float,
+        default=0.005,
+        help="latency injected in each request, in seconds",
+    )
+    parser.addoption(
+        "--bench-bandwidth",
+        type=int,
+        default=0,
+        help="bandwidth of the link, in bytes per second, 0 for unlimited",
+    )
+
+
+UNITS = {"KB": 1000, "MB": 1000**2, "GB": 1000**3}
+
+
+def parse_size(size: str) -> int:
+    return int(size[:-2]) * UNITS[size[-2:].upper()]
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--bench-sizes").split(",")
+        metafunc.parametrize("size", sizes)
+    if "concurrency" in metafunc.fixturenames:
+        concurrencies = metafunc.config.getoption("--bench-concurrency").split(",")
+        metafunc.parametrize("concurrency", [int(c) for c in concurrencies])
+
+
+@pytest.fixture(scope="session")
+def results(request):
+    results = []
+    yield results
+    output = {
+        "time": time.time(),
+        "python": platform.python_version(),
+        "latency": request.config.getoption("--bench-latency"),
+        "bandwidth": request.config.getoption("--bench-bandwidth"),
+        "results": results,
+    }
+    with open(request.config.getoption("--bench-output"), "w") as f:
+        json.dump(output, f, indent=2)
+
+
+@pytest.fixture
+def link(request):
+    return Link(
+        request.config.getoption("--bench-latency"),
+        request.config.getoption("--bench-bandwidth"),
+    )
+
+
+@pytest.fixture
+def report(tmp_path_factory, size):
+    # a repeated random block: realistic for the network, not compressible to nothing
+    path = tmp_path_factory.getbasetemp() / f"report-{size}.html"
+    if not path.exists():
+        block = os.urandom(1000**2)
+        remaining = parse_size(size)
+        with open(path, "wb") as f:
+            while remaining:
+                f.write(block[: min(len(block), remaining)])
+                remaining -= min(len(block), remaining)
+    return str(path)
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    monkeypatch.setenv("OBJECT_STORAGE_BUCKET", "test")
+    monkeypatch.setenv("OBJECT_STORAGE_USERNAME", "admin")
+    monkeypatch.setenv("OBJECT_STORAGE_PASSWORD", "password")
+    monkeypatch.setenv("OBJECT_STORAGE_CACHE_DIR", str(tmp_path / "cache"))
+    return monkeypatch
+
+
+@pytest.fixture
+def minio_env(env, link):
+    with s3_server(link) as server:
+        env.setenv("OBJECT_STORAGE_ENDPOINT", server.address)
+        env.setenv("OBJECT_STORAGE_SECURE", "false")
+        env.setenv("OBJECT_STORAGE_REGION_NAME", "us-east-1")
+        yield server
+
+
+@pytest.fixture
+def swift_env(env, link):
+    with swift_server(link) as server:
+        env.setenv("OBJECT_STORAGE_ENDPOINT", f"http://{server.address}/v3")
+        env.setenv("OBJECT_STORAGE_TENANT_ID", "tenant")
+        env.setenv("OBJECT_STORAGE_TENANT_NAME", "tenant")
+        env.setenv("OBJECT_STORAGE_REGION_NAME", "GRA")
+        yield server
@@ -0,0 +1,238 @@
+"""Local stand-ins for S3 and Swift, with injected latency and bandwidth.
+
+They implement just what the plugin uses and discard the uploaded bytes,
+keeping only the size and the etag of each object. Each one runs in a
+process of its own: its threads and memory are not measured with the plugin.
+"""
+import datetime
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Link:
+    """Network link shared by all the connections of a server."""
+
+    def __init__(self, latency: float = 0, bandwidth: int = 0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._busy_until = 0.0
+        self._lock = threading.Lock()
+
+    def transfer(self, size: int):
+        if not self.bandwidth:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._busy_until = max(now, self._busy_until) + size / self.bandwidth
+            wait = self._busy_until - now
+        time.sleep(wait)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, link: Link, requests):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.link = link
+        self.objects = {}
+        # shared with the benchmark process
+        self.requests = requests
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.server_address[1]}"
+
+
+def serve(handler, latency: float, bandwidth: int, requests, addresses):
+    server = StandInServer(handler, Link(latency, bandwidth), requests)
+    addresses.put(server.address)
+    server.serve_forever()
+
+
+class ServerProcess:
+    """Run a stand-in server in a child process for the duration of a benchmark."""
+
+    def __init__(self, handler, link: Link):
+        self._requests = multiprocessing.Value("i", 0)
+        self._addresses = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=serve,
+            args=(handler, link.latency, link.bandwidth, self._requests, self._addresses),
+            daemon=True,
+        )
+        self.address = None
+
+    @property
+    def requests(self) -> int:
+        return self._requests.value
+
+    def __enter__(self):
+        self._process.start()
+        self.address = self._addresses.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandInServer
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        """Read the request body through the link, return its (size, md5)."""
+        with self.server.requests.get_lock():
+            self.server.requests.value += 1
+        time.sleep(self.server.link.latency)
+        digest = hashlib.md5()
+        size = 0
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            while True:
+                length = int(self.rfile.readline().split(b";")[0], 16)
+                if not length:
+                    self.rfile.readline()
+                    break
+                chunk = self.rfile.read(length)
+                self.rfile.readline()
+                self.server.link.transfer(len(chunk))
+                digest.update(chunk)
+                size += len(chunk)
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining:
+                chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                self.server.link.transfer(len(chunk))
+                digest.update(chunk)
+                remaining -= len(chunk)
+                size += len(chunk)
+        return size, digest.hexdigest()
+
+    def reply(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class S3Handler(Handler):
+    def do_HEAD(self):
+        self.read_body()
+        path = urlparse(self.path).path.strip("/")
+        if "/" not in path or path in self.server.objects:
+            self.reply(200)
+        else:
+            self.reply(404)
+
+    def do_PUT(self):
+        size, etag = self.read_body()
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.strip("/")
+        if "partNumber" in query:
+            path = f"{path}#{query['partNumber'][0]}"
+        self.server.objects[path] = size
+        self.reply(200, headers={"ETag": f'"{etag}"'})
+
+    def do_POST(self):
+        self.read_body()
+        url = urlparse(self.path)
+        bucket, key = url.path.strip("/").split("/", 1)
+        if "uploads" in parse_qs(url.query, keep_blank_values=True):
+            body = (
+                "<InitiateMultipartUploadResult>"
+                f"<Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                f"<UploadId>{uuid.uuid4().hex}</UploadId>"
+                "</InitiateMultipartUploadResult>"
+            )
+        else:
+            parts = [k for k in self.server.objects if k.startswith(f"{bucket}/{key}#")]
+            self.server.objects[f"{bucket}/{key}"] = sum(
+                self.server.objects.pop(part) for part in parts
+            )
+            body = (
+                "<CompleteMultipartUploadResult>"
+                f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>\"etag\"</ETag>"
+                "</CompleteMultipartUploadResult>"
+            )
+        self.reply(200, body.encode(), {"Content-Type": "application/xml"})
+
+
+class SwiftHandler(Handler):
+    def do_POST(self):
+        # Keystone v3 password authentication
+        self.read_body()
+        expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        now = datetime.datetime.utcnow()
+        storage_url = f"http://{self.server.address}/v1/AUTH_tenant"
+        token = {
+            "token": {
+                "methods": ["password"],
+                "expires_at": expires.strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+                "issued_at": now.strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+                "user": {"id": "user", "name": "user", "domain": {"id": "default", "name": "Default"}},
+                "project": {"id": "tenant", "name": "tenant", "domain": {"id": "default", "name": "Default"}},
+                "catalog": [
+                    {
+                        "type": "object-store",
+                        "name": "swift",
+                        "id": "swift",
+                        "endpoints": [
+                            {
+                                "id": "public",
+                                "interface": "public",
+                                "region": "GRA",
+                                "region_id": "GRA",
+                                "url": storage_url,
+                            }
+                        ],
+                    }
+                ],
+            }
+        }
+        self.reply(
+            201,
+            json.dumps(token).encode(),
+            {"Content-Type": "application/json", "X-Subject-Token": uuid.uuid4().hex},
+        )
+
+    def do_GET(self):
+        self.read_body()
+        self.reply(200, b"{}", {"Content-Type": "application/json"})
+
+    def do_HEAD(self):
+        self.read_body()
+        path = urlparse(self.path).path.split("/", 3)[3]
+        if "/" not in path or path in self.server.objects:
+            self.reply(204)
+        else:
+            self.reply(404)
+
+    def do_PUT(self):
+        size, etag = self.read_body()
+        path = urlparse(self.path).path.split("/", 3)[3]
+        if "/" in path:
+            self.server.objects[path] = size
+        self.reply(201, headers={"Etag": etag})
+
+
+def s3_server(link: Link) -> ServerProcess:
+    return ServerProcess(S3Handler, link)
+
+
+def swift_server(link: Link) -> ServerProcess:
+    return ServerProcess(SwiftHandler, link)
@@ -0,0 +1,61 @@
+"""Overhead added by pytest_sessionfinish for each backend.
+
+Run with:
+
+    python -m pytest benchmarks --bench-output=benchmark.json --bench-sizes=100KB,10MB,100MB,1GB
+"""
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import parse_size
+from pytest_html_object_storage.minio import HTMLMinio
+from pytest_html_object_storage.swift import HTMLSwift
+
+
+def session_finish(plugin, htmlpath: str) -> SimpleNamespace:
+    config = SimpleNamespace(
+        option=SimpleNamespace(htmlpath=htmlpath), _report_url=None
+    )
+    session = SimpleNamespace(config=config)
+    hook = plugin.pytest_sessionfinish(session, 0)
+    next(hook)
+    with pytest.raises(StopIteration):
+        hook.send(None)
+    return config
+
+
+@pytest.mark.parametrize(
+    "backend", [pytest.param(HTMLMinio, id="minio"), pytest.param(HTMLSwift, id="swift")]
+)
+def test_sessionfinish(request, backend, report, size, concurrency, env, results):
+    name = backend.__name__[4:].lower()
+    server = request.getfixturevalue(f"{name}_env")
+    env.setenv("OBJECT_STORAGE_CONCURRENCY", str(concurrency))
+    env.setenv("OBJECT_STORAGE_PART_SIZE", "16")
+    plugin = backend(SimpleNamespace(getoption=lambda name: True))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        config = session_finish(plugin, report)
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        plugin.close()
+
+    assert config._report_url
+    results.append(
+        {
+            "backend": name,
+            "size": parse_size(size),
+            "concurrency": concurrency,
+            "seconds": duration,
+            "throughput": parse_size(size) / duration,
+            "requests": server.requests,
+            "python_peak_memory": peak,
+        }
+    )
@@ -0,0 +1,85 @@
+import argparse
+import logging
+import os
+import sys
+from typing import List
+
+from pytest_html_object_storage.plugin import get_backends
+
+
+def get_backend(name: str):
+    """Instantiate a backend outside of a pytest session, configured by env var."""
+    backend_class = get_backends()[name].load()
+    missing = [var for var in backend_class.required_env if not os.environ.get(var)]
+    if missing:
+        sys.exit(f"You must set the environment variables {', '.join(missing)}")
+    return backend_class(None)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return number
+
+
+def merge(args: argparse.Namespace):
+    backend = get_backend(args.backend)
+    try:
+        print(backend.merge(args.run_id))
+    finally:
+        backend.close()
+
+
+def gc(args: argparse.Namespace):
+    backend = get_backend(args.backend)
+    try:
+        runs, objects = backend.gc(args.days, args.dry_run)
+    finally:
+        backend.close()
+    action = "Would delete" if args.dry_run else "Deleted"
+    print(f"{action} {objects} objects of {runs} runs older than {args.days} days")
+
+
+def flush(args: argparse.Namespace):
+    backend = get_backend(args.backend)
+    try:
+        sent, failed = backend.flush()
+    finally:
+        backend.close()
+    print(f"Sent {sent} spooled reports, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+
+def main(argv: List[str] = None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="pytest-html-object-storage")
+    parser.add_argument(
+        "--backend",
+        choices=sorted(get_backends()),
+        default="minio",
+        help="object storage backend, configured with the same env vars as the plugin",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge_parser = commands.add_parser(
+        "merge", help="merge the reports of the shards of a run into one report"
+    )
+    merge_parser.add_argument("run_id", help="OBJECT_STORAGE_RUN_ID of the shards")
+    merge_parser.set_defaults(func=merge)
+    gc_parser = commands.add_parser("gc", help="delete the runs older than N days")
+    gc_parser.add_argument("--days", type=positive_int, required=True)
+    gc_parser.add_argument(
+        "--dry-run", action="store_true", help="only count the objects to delete"
+    )
+    gc_parser.set_defaults(func=gc)
+    flush_parser = commands.add_parser(
+        "flush", help="send the reports spooled with OBJECT_STORAGE_SPOOL"
+    )
+    flush_parser.set_defaults(func=flush)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import glob
+import logging
+import os
+import time
+from typing import Callable, List, NamedTuple, Tuple
+
+from pytest_html_object_storage.background import daemon_map
+from pytest_html_object_storage.multipart import MiB
+
+log = logging.getLogger(__name__)
+
+
+class ArtifactsResult(NamedTuple):
+    files: int
+    failed: int
+    size: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        return self.size / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        text = (
+            f"{self.files} artifacts ({self.size / MiB:.2f} MiB) sent in "
+            f"{self.seconds:.2f}s at {self.throughput / MiB:.2f} MiB/s"
+        )
+        if self.failed:
+            text += f", {self.failed} failed"
+        return text
+
+
+def get_patterns(value: str) -> List[str]:
+    return [pattern.strip() for pattern in (value or "").split(",") if pattern.strip()]
+
+
+def collect_artifacts(patterns: List[str], root: str = None) -> List[Tuple[str, str]]:
+    """Expand the globs and directories of `patterns` to a list of (key, path).
+
+    Keys are the paths relative to `root`, the current directory by default,
+    or to the parent directory of the match when it is outside `root`.
+    """
+    root = os.path.abspath(root or os.getcwd())
+    artifacts = {}
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(root, pattern), recursive=True)
+        if not matches:
+            log.warning(f"No artifact matches {pattern}")
+        for match in matches:
+            base = root
+            if os.path.relpath(match, root).startswith(os.pardir):
+                base = os.path.dirname(os.path.abspath(match))
+            if os.path.isdir(match):
+                paths = [
+                    os.path.join(directory, filename)
+                    for directory, _, files in os.walk(match)
+                    for filename in files
+                ]
+            else:
+                paths = [match]
+            for path in paths:
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                artifacts[key] = path
+    return sorted(artifacts.items())
+
+
+def upload_artifacts(
+    artifacts: List[Tuple[str, str]],
+    prefix: str,
+    put: Callable[[str, str], None],
+    concurrency: int,
+) -> ArtifactsResult:
+    """Upload the (key, path) artifacts under `prefix` on daemon worker threads.
+
+    A failed upload is logged and does not stop the others.
+    """
+
+    def upload(artifact: Tuple[str, str]) -> int:
+        key, path = artifact
+        try:
+            put(f"{prefix}/{key}", path)
+        except Exception as e:
+            log.error(f"Artifact {path} upload error: {e}")
+            return -1
+        return os.path.getsize(path)
+
+    start = time.perf_counter()
+    sizes = daemon_map(upload, artifacts, concurrency)
+    result = ArtifactsResult(
+        files=sum(1 for size in sizes if size >= 0),
+        failed=sizes.count(-1),
+        size=sum(size for size in sizes if size >= 0),
+        seconds=time.perf_counter() - start,
+    )
+    log.info(f"Artifacts: {result}")
+    return result
@@ -0,0 +1,59 @@
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Callable, Dict, List, Tuple
+
+from pytest_html_object_storage.background import daemon_map
+from pytest_html_object_storage.multipart import MiB
+
+log = logging.getLogger(__name__)
+
+ASSETS_DIR = "assets"
+
+
+def content_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MiB), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_assets(report_path: str, prefix: str) -> Dict[str, Tuple[str, str]]:
+    """Map each file of the report `assets/` directory to its content-addressed key.
+
+    Return {relative path used in the report: (object key, local path)}.
+    """
+    assets_path = os.path.join(os.path.dirname(os.path.abspath(report_path)), ASSETS_DIR)
+    assets = {}
+    for root, _, files in os.walk(assets_path):
+        for filename in files:
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, os.path.dirname(assets_path))
+            extension = os.path.splitext(filename)[1]
+            key = f"{prefix}/{file_digest(path)}{extension}"
+            assets[relative.replace(os.sep, "/")] = (key, path)
+    return assets
+
+
+def upload_missing(
+    objects: List[Tuple[str, str]],
+    exists: Callable[[str], bool],
+    put: Callable[[str, str], None],
+    concurrency: int,
+) -> Tuple[int, int]:
+    """Upload the (key, path) objects not already in the bucket.
+
+    The existence checks, then the uploads, run on daemon worker threads.
+    Return the number of uploaded and skipped objects.
+    """
+    objects = list(dict(objects).items())
+    found = daemon_map(lambda obj: exists(obj[0]), objects, concurrency)
+    missing = [obj for obj, present in zip(objects, found) if not present]
+    daemon_map(lambda obj: put(*obj), missing, concurrency)
+    return len(missing), len(objects) - len(missing)
@@ -0,0 +1,566 @@
+import datetime
+import logging
+import os
+import posixpath
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import (
+    Callable,
+    ContextManager,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import pytest
+from _pytest.config import Config, ExitCode
+from _pytest.main import Session
+from _pytest.reports import TestReport
+from _pytest.terminal import TerminalReporter
+
+from pytest_html_object_storage.artifacts import (
+    collect_artifacts,
+    get_patterns,
+    upload_artifacts,
+)
+from pytest_html_object_storage.background import BackgroundUpload
+from pytest_html_object_storage.bandwidth import (
+    BandwidthLimiter,
+    ThrottledReader,
+    get_bandwidth_file,
+)
+from pytest_html_object_storage.cache import FileCache
+from pytest_html_object_storage.compression import check_compression
+from pytest_html_object_storage.gc import collect_garbage
+from pytest_html_object_storage.index import (
+    index_keys,
+    prune_index,
+    render_index,
+    run_entry,
+    update_index,
+)
+from pytest_html_object_storage.live import LivePublisher, get_outcome
+from pytest_html_object_storage.metrics import Timings, publish_timings
+from pytest_html_object_storage.multipart import MiB
+from pytest_html_object_storage.pipeline import ReportPipeline
+from pytest_html_object_storage.results import (
+    RESULTS_FILE,
+    ResultsRecorder,
+    ResultsTable,
+    load_results,
+    results_key,
+)
+from pytest_html_object_storage.retry import UploadPolicy
+from pytest_html_object_storage.shards import (
+    get_result,
+    merge_run,
+    merged_key,
+    shard_key,
+    shard_payload,
+    shards_prefix,
+)
+from pytest_html_object_storage.spool import Spool, get_spool_dir
+from pytest_html_object_storage.utils import env_bool, env_int
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class HTMLObjectStorage(ABC):
+    """Storage independent part of the backends: pytest hooks and run features.
+
+    The backends implement the storage operations, called with the upload
+    policy: `_send_html`, `_send_data`, `_send_file`, `_list_objects`,
+    `_get_object`, `_list_all` and `_delete_batch`, plus `_index_object`,
+    `_send_index_page`, `_object_url`, `_get_retention`, `_is_retryable`
+    and `close`.
+    """
+
+    # entry point name of the backend, also used in the spool, the timings and the log messages
+    backend = None
+    label = None
+    # name of the storage in the terminal messages
+    storage = None
+    # read the index back after each write, for stores without conditional updates
+    index_verify = False
+    required_env = (
+        "OBJECT_STORAGE_ENDPOINT",
+        "OBJECT_STORAGE_BUCKET",
+        "OBJECT_STORAGE_USERNAME",
+        "OBJECT_STORAGE_PASSWORD",
+    )
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.os_endpoint = os.environ.get("OBJECT_STORAGE_ENDPOINT")
+        self.os_bucket = os.environ.get("OBJECT_STORAGE_BUCKET")
+        self.os_username = os.environ.get("OBJECT_STORAGE_USERNAME")
+        self.os_password = os.environ.get("OBJECT_STORAGE_PASSWORD")
+        self.os_region_name = os.environ.get("OBJECT_STORAGE_REGION_NAME")
+        self.os_retention = self._get_retention()
+        self.os_policy = self._get_policy()
+        self.os_background = env_bool("OBJECT_STORAGE_BACKGROUND")
+        self.os_background_timeout = env_int("OBJECT_STORAGE_BACKGROUND_TIMEOUT", 60)
+        self.os_part_size = env_int("OBJECT_STORAGE_PART_SIZE", 16) * MiB
+        self.os_concurrency = env_int("OBJECT_STORAGE_CONCURRENCY", 4)
+        self.os_compression = os.environ.get("OBJECT_STORAGE_COMPRESSION")
+        check_compression(self.os_compression)
+        self.os_compression_threshold = (
+            env_int("OBJECT_STORAGE_COMPRESSION_THRESHOLD", 64) * 1024
+        )
+        self.os_shared_assets = env_bool("OBJECT_STORAGE_SHARED_ASSETS")
+        self.os_assets_prefix = os.environ.get("OBJECT_STORAGE_ASSETS_PREFIX", "assets")
+        self.os_data_uri_threshold = env_int("OBJECT_STORAGE_DATA_URI_THRESHOLD") * 1024
+        self.os_timeout = env_int("OBJECT_STORAGE_TIMEOUT", 300)
+        self.os_pool_size = env_int("OBJECT_STORAGE_POOL_SIZE", self.os_concurrency)
+        self.os_bandwidth = env_int("OBJECT_STORAGE_BANDWIDTH")
+        self.bandwidth = (
+            BandwidthLimiter(self.os_bandwidth, get_bandwidth_file())
+            if self.os_bandwidth
+            else None
+        )
+        self.policy = UploadPolicy(
+            self._is_retryable,
+            self.os_endpoint,
+            env_int("OBJECT_STORAGE_DEADLINE", 600),
+            int(os.environ.get("OBJECT_STORAGE_RETRIES", 3)),
+            float(os.environ.get("OBJECT_STORAGE_BACKOFF", 0.5)),
+            env_int("OBJECT_STORAGE_HEDGE_PERCENTILE"),
+            env_int("OBJECT_STORAGE_HEDGE_MAX_SIZE", 1024) * 1024,
+        )
+        self.bucket_cache = FileCache(
+            "buckets.json", env_int("OBJECT_STORAGE_BUCKET_CACHE_TTL", 3600)
+        )
+        self.os_live = env_bool("OBJECT_STORAGE_LIVE")
+        self.os_live_interval = env_int("OBJECT_STORAGE_LIVE_INTERVAL", 30)
+        self.os_live_every = env_int("OBJECT_STORAGE_LIVE_EVERY")
+        self.os_metrics_file = os.environ.get("OBJECT_STORAGE_METRICS_FILE")
+        self.os_artifacts = get_patterns(os.environ.get("OBJECT_STORAGE_ARTIFACTS"))
+        self.artifacts = None
+        self.os_index = env_bool("OBJECT_STORAGE_INDEX")
+        self.os_index_prefix = os.environ.get("OBJECT_STORAGE_INDEX_PREFIX", "")
+        self.os_index_size = env_int("OBJECT_STORAGE_INDEX_SIZE", 500)
+        self.outcomes = {}
+        self.os_run_id = os.environ.get("OBJECT_STORAGE_RUN_ID")
+        self.os_shard = (
+            os.environ.get("OBJECT_STORAGE_SHARD")
+            or f"{socket.gethostname()}-{os.getpid()}"
+        )
+        self.os_shards = env_int("OBJECT_STORAGE_SHARDS")
+        self.results = []
+        self.merged_url = None
+        self.os_results = env_bool("OBJECT_STORAGE_RESULTS")
+        self.recorder = ResultsRecorder()
+        self.os_spool = env_bool("OBJECT_STORAGE_SPOOL")
+        self.spool = Spool(
+            get_spool_dir(), f"{self.backend} {self.os_endpoint} {self.os_bucket}"
+        )
+        self.spooled = None
+        self.flushing = None
+        self.start = time.time()
+        self.timings = Timings(self.backend)
+        self.access_url = None
+        self.upload = None
+        self.live = None
+        self.name = None
+
+    @staticmethod
+    def _get_policy() -> str:
+        policy = os.environ.get("OBJECT_STORAGE_POLICY")
+        if not policy or policy == "public-read":
+            return "public-read"
+        else:
+            return ""
+
+    @staticmethod
+    @abstractmethod
+    def _get_retention() -> int:
+        ...
+
+    @staticmethod
+    @abstractmethod
+    def _is_retryable(e: Exception) -> bool:
+        ...
+
+    def get_access_url(self, name: str) -> str:
+        self.access_url = self._object_url(name)
+        return self.access_url
+
+    @abstractmethod
+    def _object_url(self, name: str) -> str:
+        ...
+
+    def close(self):
+        pass
+
+    def _throttled(self, f):
+        """Read `f` within the host bandwidth if limited."""
+        return ThrottledReader(f, self.bandwidth) if self.bandwidth else f
+
+    def _run(self, call: Callable[[], T], size: int = 0, hedge: bool = False) -> T:
+        """Run a storage operation with the upload policy, `hedge` for single PUTs."""
+        return self.policy.run(call, size, hedge)
+
+    def _pipeline(self, name: str, exists, put, self_contained: bool) -> ReportPipeline:
+        return ReportPipeline(
+            name,
+            exists,
+            put,
+            self.timings,
+            self.os_concurrency,
+            self.os_assets_prefix,
+            shared_assets=self.os_shared_assets and not self_contained,
+            data_uri_threshold=self.os_data_uri_threshold,
+            compression=self.os_compression,
+            compression_threshold=self.os_compression_threshold,
+        )
+
+    @abstractmethod
+    def _send_html(self, name: str, contentfile: str, self_contained: bool):
+        ...
+
+    def send_html(self, name, contentfile: str, self_contained: bool = None):
+        if self_contained is None:
+            self_contained = self.config.getoption("self_contained_html")
+        self._run(
+            lambda: self._send_html(name, contentfile, self_contained),
+            os.path.getsize(contentfile),
+        )
+
+    @abstractmethod
+    def _send_data(self, name: str, data: bytes, content_type: str):
+        ...
+
+    def send_data(self, name: str, data: bytes, content_type: str):
+        self._run(
+            lambda: self._send_data(name, data, content_type), len(data), hedge=True
+        )
+
+    @abstractmethod
+    def _send_file(self, key: str, path: str):
+        ...
+
+    def send_file(self, key: str, path: str):
+        self._run(
+            lambda: self._send_file(key, path), os.path.getsize(path), hedge=True
+        )
+
+    @abstractmethod
+    def _list_objects(self, prefix: str) -> List[str]:
+        ...
+
+    def list_objects(self, prefix: str) -> List[str]:
+        return self._run(lambda: self._list_objects(prefix))
+
+    @abstractmethod
+    def _get_object(self, key: str) -> bytes:
+        ...
+
+    def read_object(self, key: str) -> bytes:
+        return self._run(lambda: self._get_object(key))
+
+    @abstractmethod
+    def _index_object(self) -> ContextManager[Tuple[Callable, Callable]]:
+        """Context of the index updates: (read, write) of the JSON index."""
+
+    def _update_index(self, entry: dict) -> dict:
+        with self._index_object() as (read, write):
+            return update_index(
+                read, write, entry, self.os_index_size, verify=self.index_verify
+            )
+
+    def _prune_index(self, runs: Set[str]) -> Optional[dict]:
+        with self._index_object() as (read, write):
+            return prune_index(read, write, runs, verify=self.index_verify)
+
+    @abstractmethod
+    def _send_index_page(self, key: str, data: bytes):
+        ...
+
+    def _render_index(self, index: dict):
+        self._send_index_page(
+            index_keys(self.os_index_prefix)[1],
+            render_index(index, self.os_index_prefix).encode(),
+        )
+
+    def _index_run(self, entry: dict):
+        try:
+            self._render_index(self._run(lambda: self._update_index(entry)))
+        except Exception as e:
+            log.error(f"{self.label} run index error: {self.os_endpoint} - {e}")
+
+    def _unindex_runs(self, runs: Set[str]):
+        """Remove the runs deleted by gc from the index of OBJECT_STORAGE_INDEX_PREFIX."""
+        try:
+            index = self._run(lambda: self._prune_index(runs))
+            if index is not None:
+                self._render_index(index)
+        except Exception as e:
+            log.error(f"{self.label} run index error: {self.os_endpoint} - {e}")
+
+    def _new_name(self) -> str:
+        if self.os_run_id:
+            return f"{self.os_run_id}/{self.os_shard}/report.html"
+        return f"{str(uuid.uuid4())}/report.html"
+
+    def merge(self, run_id: str) -> str:
+        """Merge the shards of `run_id` into one report, return its URL."""
+        merge_run(
+            run_id,
+            self.list_objects,
+            self.read_object,
+            self.send_data,
+            self.os_concurrency,
+        )
+        self.merged_url = self._object_url(merged_key(run_id))
+        return self.merged_url
+
+    @abstractmethod
+    def _list_all(self) -> Iterator[Tuple[str, datetime.datetime]]:
+        ...
+
+    @abstractmethod
+    def _delete_batch(self, keys: List[str]) -> int:
+        ...
+
+    def gc(self, days: int, dry_run: bool = False) -> Tuple[int, int]:
+        """Delete the runs older than `days`, return the number of runs and of objects."""
+        keep = {
+            self.os_assets_prefix.split("/")[0],
+            self.os_index_prefix.split("/")[0],
+        }
+        return collect_garbage(
+            self._run(lambda: list(self._list_all())),
+            lambda keys: self._run(lambda: self._delete_batch(keys)),
+            days,
+            keep,
+            self.os_concurrency,
+            dry_run,
+            self._unindex_runs,
+        )
+
+    def _send_results(self, session: Session, name: str):
+        payload = self.recorder.payload(name, self.start, session.exitstatus)
+        try:
+            self.send_data(results_key(name), payload, "application/octet-stream")
+        except Exception as e:
+            log.error(f"{self.label} results error: {self.os_endpoint} - {e}")
+
+    def load_results(self, prefix: str = "") -> ResultsTable:
+        """Load the results of the runs under `prefix` for percentile and trend queries."""
+        keys = [
+            key
+            for key in self.list_objects(prefix)
+            if posixpath.basename(key) == RESULTS_FILE
+        ]
+        return load_results(keys, self.read_object, self.os_concurrency)
+
+    def _send_shard(self, name: str):
+        payload = shard_payload(
+            self.os_shard, name, self.start, self.outcomes, self.results
+        )
+        try:
+            self.send_data(
+                shard_key(self.os_run_id, self.os_shard), payload, "application/gzip"
+            )
+            # the last shard to finish merges the run
+            if self.os_shards and (
+                len(self.list_objects(shards_prefix(self.os_run_id))) >= self.os_shards
+            ):
+                self.merge(self.os_run_id)
+        except Exception as e:
+            log.error(f"{self.label} shard error: {self.os_endpoint} - {e}")
+
+    def _send_spooled(self, path: str, meta: dict):
+        self.send_html(meta["name"], path, meta["self_contained"])
+        if meta["index"]:
+            # the endpoint is only known once sent
+            self._index_run(dict(meta["index"], url=self.get_access_url(meta["name"])))
+
+    def flush(self) -> Tuple[int, int]:
+        """Send the spooled reports, return the number sent and failed."""
+        return self.spool.flush(self._send_spooled, self.os_concurrency)
+
+    def _flush_previous(self) -> Optional[subprocess.Popen]:
+        """Flush the reports of the previous runs in a detached process.
+
+        Never waited for: pytest exits whatever the storage health, and a
+        flush interrupted with the host is resumed by the next one. `backend`
+        must be the name of the backend entry point.
+        """
+        try:
+            return subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "pytest_html_object_storage",
+                    "--backend",
+                    self.backend,
+                    "flush",
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except OSError as e:
+            log.error(f"{self.label} flush error: {self.spool.directory} - {e}")
+            return None
+
+    def _enqueue(self, session: Session, name: str, htmlfile: str):
+        self_contained = session.config.getoption("self_contained_html")
+        meta = {"name": name, "self_contained": self_contained, "index": None}
+        if self.os_index:
+            meta["index"] = run_entry(
+                name,
+                self._object_url(name),
+                self.start,
+                self.outcomes,
+                session.exitstatus,
+            )
+        try:
+            self.spooled = self.spool.enqueue(
+                htmlfile, meta, assets=not self_contained
+            )
+        except OSError as e:
+            log.error(f"{self.label} spool error: {self.spool.directory} - {e}")
+
+    def _upload(self, session: Session, name: str, htmlfile: str):
+        if self.os_spool:
+            self._enqueue(session, name, htmlfile)
+            return
+        try:
+            self.send_html(name, htmlfile)
+            session.config._report_url = self.get_access_url(name)
+        except Exception as e:
+            log.error(f"{self.label} send_html error: {self.os_endpoint} - {e}")
+            if self.live:
+                self.live.fail()
+        else:
+            if self.live:
+                self.live.finish()
+            if self.os_artifacts:
+                self.artifacts = upload_artifacts(
+                    collect_artifacts(self.os_artifacts),
+                    os.path.dirname(name),
+                    self.send_file,
+                    self.os_concurrency,
+                )
+            if self.os_index:
+                self._index_run(
+                    run_entry(
+                        name,
+                        self.access_url,
+                        self.start,
+                        self.outcomes,
+                        session.exitstatus,
+                    )
+                )
+            if self.os_results:
+                self._send_results(session, name)
+            if self.os_run_id:
+                self._send_shard(name)
+        publish_timings(session.config, self.timings, self.os_metrics_file)
+
+    def pytest_sessionstart(self, session: Session):
+        self.start = time.time()
+        if self.os_spool and self.spool.entries():
+            # the reports spooled by the previous runs
+            self.flushing = self._flush_previous()
+        if self.os_live:
+            self.name = self._new_name()
+            self.live = LivePublisher(
+                self.send_data,
+                self.name,
+                self.os_live_interval,
+                self.os_live_every,
+            ).start()
+
+    def pytest_report_header(self, config: Config):
+        if self.live:
+            return (
+                f"Live HTML report on {self.storage} object storage "
+                f"at {self.get_access_url(self.live.page_name)}"
+            )
+
+    def pytest_collection_finish(self, session: Session):
+        if self.live:
+            self.live.collected = session.testscollected
+
+    def pytest_runtest_logreport(self, report: TestReport):
+        if report.when == "call" or not report.passed:
+            outcome = get_outcome(report)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if self.os_run_id:
+                self.results.append(get_result(report))
+        if self.os_results:
+            self.recorder.add(report)
+        if self.live:
+            self.live.add(report)
+
+    @pytest.hookimpl(trylast=True, hookwrapper=True)
+    def pytest_sessionfinish(self, session: Session, exitstatus: Union[int, ExitCode]):
+        outcome = yield
+        htmlfile = getattr(session.config.option, "htmlpath", None)
+        if self.live:
+            self.live.stop()
+        if htmlfile:
+            name = self.name or self._new_name()
+            if self.os_background:
+                self.upload = BackgroundUpload(
+                    self._upload, session, name, htmlfile
+                ).start()
+            else:
+                self._upload(session, name, htmlfile)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_terminal_summary(
+        self,
+        terminalreporter: TerminalReporter,
+        exitstatus: Union[int, ExitCode],
+        config: Config,
+    ):
+        if self.upload and not self.upload.wait(self.os_background_timeout):
+            terminalreporter.write_sep(
+                "-",
+                f"HTML report upload on {self.storage} object storage still pending "
+                f"after {self.os_background_timeout}s",
+            )
+        elif self.spooled:
+            terminalreporter.write_sep(
+                "-",
+                f"HTML report spooled in {self.spooled}, "
+                f"sent by the next run or by pytest-html-object-storage flush",
+            )
+        elif getattr(config, "_report_url", None):
+            terminalreporter.write_sep(
+                "-", f"HTML report sent on {self.storage} object storage at {self.access_url}"
+            )
+            if self.artifacts:
+                terminalreporter.write_sep("-", str(self.artifacts))
+            if self.merged_url:
+                terminalreporter.write_sep(
+                    "-", f"Merged HTML report of run {self.os_run_id} at {self.merged_url}"
+                )
+        else:
+            terminalreporter.write_sep(
+                "-", f"HTML report upload on {self.storage} object storage failed"
+            )
+        if self.flushing:
+            terminalreporter.write_sep(
+                "-",
+                f"Spooled HTML reports of the previous runs sent on {self.storage} "
+                f"object storage in the background by process {self.flushing.pid}",
+            )
+        if config.getoption("verbose") > 0:
+            for line in self.timings.lines():
+                terminalreporter.write_line(f"  {line}")
@@ -0,0 +1,88 @@
+import contextvars
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, List, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BackgroundUpload:
+    """Run an upload on a worker thread so the rest of the teardown keeps going.
+
+    The thread is a daemon, like the workers of the uploads it runs (see
+    `daemon_map` and `race`): if the deadline given to `wait` expires, pytest
+    exits without waiting for them.
+    """
+
+    def __init__(self, target, *args):
+        self.error = None
+        self._target = target
+        self._args = args
+        self._thread = threading.Thread(
+            target=self._run, name="pytest-html-object-storage", daemon=True
+        )
+
+    def _run(self):
+        try:
+            self._target(*self._args)
+        except Exception as e:
+            log.error(f"Background upload error: {e}")
+            self.error = e
+
+    def start(self) -> "BackgroundUpload":
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float) -> bool:
+        """Return True if the upload is finished, False if still pending."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+
+def daemon_map(fn: Callable[[T], R], items: Iterable[T], concurrency: int) -> List[R]:
+    """Return `[fn(item) for item in items]`, computed on `concurrency` daemon threads.
+
+    A ThreadPoolExecutor is joined at interpreter exit: an upload abandoned
+    past its deadline would keep pytest alive. The workers run in a copy of
+    the caller context, and the first error in order of the items is raised
+    once all the items are done.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = {}
+    pending = queue.SimpleQueue()
+    for index in range(len(items)):
+        pending.put(index)
+
+    def work():
+        while True:
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = fn(items[index])
+            except Exception as e:
+                errors[index] = e
+
+    context = contextvars.copy_context()
+    workers = [
+        threading.Thread(
+            target=context.copy().run,
+            args=(work,),
+            name="pytest-html-object-storage-worker",
+            daemon=True,
+        )
+        for _ in range(min(max(concurrency, 1), len(items)))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[min(errors)]
+    return results
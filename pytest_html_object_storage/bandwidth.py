@@ -0,0 +1,105 @@
+import logging
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from pytest_html_object_storage.cache import get_cache_dir
+
+log = logging.getLogger(__name__)
+
+# bytes granted at a time: the uploads running together get interleaved slots
+CHUNK_SIZE = 64 * 1024
+# a shared clock further ahead is left by a clock change, not by a backlog
+MAX_BACKLOG = 3600
+STATE = struct.Struct("d")
+
+
+def get_bandwidth_file() -> str:
+    return os.environ.get("OBJECT_STORAGE_BANDWIDTH_FILE") or os.path.join(
+        get_cache_dir(), "bandwidth"
+    )
+
+
+class BandwidthLimiter:
+    """Upload bandwidth of `rate` bytes per second shared by the processes of the host.
+
+    The token bucket is kept as a virtual clock in `path`: the time at which
+    the bytes granted so far are sent at `rate`. Each upload reserves the
+    next slot under a file lock then waits for it outside, so the uploads
+    of all the processes are served in turn, chunk by chunk, and get fair
+    shares. Without the shared file the limit only applies to the process.
+    """
+
+    def __init__(self, rate: int, path: str):
+        self.rate = rate
+        self.path = path
+        self._lock = threading.Lock()
+        self._clock = 0.0
+        self._fd = None
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            log.warning(f"Bandwidth limited per process: {path} - {e}")
+
+    def _read(self) -> float:
+        if self._fd is None:
+            return self._clock
+        data = os.pread(self._fd, STATE.size, 0)
+        return STATE.unpack(data)[0] if len(data) == STATE.size else 0.0
+
+    def _write(self, clock: float):
+        self._clock = clock
+        if self._fd is not None:
+            os.pwrite(self._fd, STATE.pack(clock), 0)
+
+    def reserve(self, size: int) -> float:
+        """Reserve the next `size` bytes, return the delay before sending them."""
+        # flock() does not exclude the threads sharing the descriptor
+        with self._lock:
+            if self._fd is not None and fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                clock = self._read()
+                if not now <= clock <= now + MAX_BACKLOG:
+                    clock = now
+                self._write(clock + size / self.rate)
+            finally:
+                if self._fd is not None and fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return clock - now
+
+    def acquire(self, size: int):
+        delay = self.reserve(size)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ThrottledReader:
+    """File-like wrapper reading at most one chunk at a time, at the limiter rate.
+
+    The other attributes (tell, seek, length...) are the ones of the wrapped
+    file, so the clients can still rewind it to retry.
+    """
+
+    def __init__(self, file: BinaryIO, limiter: BandwidthLimiter):
+        self._file = file
+        self._limiter = limiter
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > CHUNK_SIZE:
+            size = CHUNK_SIZE
+        data = self._file.read(size)
+        self._limiter.acquire(len(data))
+        return data
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+def get_cache_dir() -> str:
+    cache_dir = os.environ.get("OBJECT_STORAGE_CACHE_DIR")
+    if cache_dir:
+        return cache_dir
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "pytest-html-object-storage",
+    )
+
+
+class FileCache:
+    """JSON key/value store on disk shared between pytest runs.
+
+    Entries expire after `ttl` seconds. The file is only readable by its owner,
+    reads and writes hold a file lock and writes are atomic, so concurrent
+    pytest processes on the same host can share it. Any I/O error is logged
+    and the cache behaves as empty: it must never break an upload.
+    """
+
+    def __init__(self, filename: str, ttl: int):
+        self.ttl = ttl
+        self.path = os.path.join(get_cache_dir(), filename)
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with self._lock():
+                entry = self._read().get(key)
+        except OSError as e:
+            log.warning(f"Cache {self.path} unreadable: {e}")
+            return None
+        if entry and entry["expires"] > time.time():
+            return entry["value"]
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            with self._lock():
+                entries = self._read()
+                now = time.time()
+                entries = {k: v for k, v in entries.items() if v["expires"] > now}
+                entries[key] = {"value": value, "expires": expires}
+                self._write(entries)
+        except OSError as e:
+            log.warning(f"Cache {self.path} unwritable: {e}")
+
+    def delete(self, key: str):
+        try:
+            with self._lock():
+                entries = self._read()
+                if entries.pop(key, None) is not None:
+                    self._write(entries)
+        except OSError as e:
+            log.warning(f"Cache {self.path} unwritable: {e}")
@@ -0,0 +1,53 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generic, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+class ClientPool(Generic[T]):
+    """Keep-alive clients for clients that are not thread-safe.
+
+    A client is checked out by one thread at a time and given back to the
+    pool afterwards, so its HTTP connection is reused by the next upload
+    instead of opening a new one. At most `maxsize` clients are kept idle.
+    """
+
+    def __init__(
+        self, factory: Callable[[], T], close: Callable[[T], None], maxsize: int
+    ):
+        self._factory = factory
+        self._close = close
+        self._idle = queue.LifoQueue(maxsize)
+        self._clients: List[T] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self) -> Iterator[T]:
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            client = self._factory()
+            with self._lock:
+                self._clients.append(client)
+        try:
+            yield client
+        finally:
+            try:
+                self._idle.put_nowait(client)
+            except queue.Full:
+                self._discard(client)
+
+    def _discard(self, client: T):
+        with self._lock:
+            self._clients.remove(client)
+        self._close(client)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, []
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        for client in clients:
+            self._close(client)
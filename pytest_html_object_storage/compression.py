@@ -0,0 +1,53 @@
+import zlib
+from typing import Optional
+
+# algorithm name -> Content-Encoding header value
+ENCODINGS = {"gzip": "gzip", "br": "br", "zstd": "zstd"}
+
+
+class _Brotli:
+    def __init__(self):
+        import brotli
+
+        self._compressor = brotli.Compressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        import zstandard
+
+        self._compressor = zstandard.ZstdCompressor().compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+def get_compressor(algorithm: str):
+    if algorithm == "gzip":
+        return zlib.compressobj(wbits=31)
+    if algorithm == "br":
+        return _Brotli()
+    if algorithm == "zstd":
+        return _Zstd()
+    raise Exception(f"Unknown compression algorithm: {algorithm}")
+
+
+def check_compression(algorithm: Optional[str]):
+    """Fail early if the compression algorithm is unknown or its library is missing."""
+    if not algorithm:
+        return
+    try:
+        get_compressor(algorithm)
+    except ImportError as e:
+        raise Exception(
+            f"Compression {algorithm} needs the {e.name} package to be installed"
+        )
@@ -0,0 +1,63 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from pytest_html_object_storage.cache import FileCache
+
+log = logging.getLogger(__name__)
+
+
+def get_endpoints(value: Optional[str]) -> List[str]:
+    """Split the comma separated OBJECT_STORAGE_ENDPOINT."""
+    return [endpoint.strip() for endpoint in (value or "").split(",") if endpoint.strip()]
+
+
+class EndpointRanking:
+    """Rank the endpoints by the latency of `probe(endpoint)`, fastest first.
+
+    The endpoints are probed concurrently, those whose probe fails are
+    ranked last. The ranking is cached on disk for `ttl` seconds and shared
+    by the pytest runs of the host, unless no endpoint answered.
+    """
+
+    def __init__(self, endpoints: List[str], probe: Callable[[str], None], ttl: int):
+        self.endpoints = endpoints
+        self.probe = probe
+        self.cache = FileCache("endpoints.json", ttl)
+        self.key = "|".join(endpoints)
+
+    def _latency(self, endpoint: str) -> Optional[float]:
+        start = time.monotonic()
+        try:
+            self.probe(endpoint)
+        except Exception as e:
+            log.warning(f"Endpoint {endpoint} unhealthy: {e}")
+            return None
+        return time.monotonic() - start
+
+    def rank(self) -> List[str]:
+        ranking = self.cache.get(self.key)
+        if ranking:
+            return [endpoint for endpoint, _ in ranking]
+        with ThreadPoolExecutor(max_workers=len(self.endpoints)) as executor:
+            latencies = list(executor.map(self._latency, self.endpoints))
+        # stable: equally unhealthy endpoints keep their configured order
+        ranking = sorted(
+            zip(self.endpoints, latencies),
+            key=lambda item: (item[1] is None, item[1] or 0),
+        )
+        log.info(
+            "Endpoints ranking: "
+            + ", ".join(
+                f"{endpoint} ({'unhealthy' if latency is None else f'{latency * 1000:.0f}ms'})"
+                for endpoint, latency in ranking
+            )
+        )
+        if any(latency is not None for latency in latencies):
+            self.cache.set(self.key, ranking)
+        return [endpoint for endpoint, _ in ranking]
+
+    def invalidate(self):
+        """Probe again at the next ranking, after a failover."""
+        self.cache.delete(self.key)
@@ -0,0 +1,80 @@
+import datetime
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pytest_html_object_storage.index import index_keys
+
+log = logging.getLogger(__name__)
+
+# S3 DeleteObjects accepts up to 1000 keys, kept for the Swift bulk-delete
+# too so that a request stays well under the proxy timeouts
+DELETE_BATCH_SIZE = 1000
+
+
+def expired_runs(
+    objects: Iterable[Tuple[str, datetime.datetime]], days: int, keep: Set[str]
+) -> Dict[str, List[str]]:
+    """Group the (key, last modified) objects by run and return the expired runs.
+
+    A run is the first segment of the keys, it is expired when all its
+    objects are older than `days`. The objects at the root of the bucket, the
+    `keep` prefixes (shared assets, index) and the prefixes holding a run index,
+    whatever the OBJECT_STORAGE_INDEX_PREFIX of the projects writing them,
+    are never expired.
+    """
+    limit = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    index_name, _ = index_keys("")
+    keep = set(keep)
+    runs = {}
+    newest = {}
+    for key, modified in objects:
+        run, sep, _ = key.partition("/")
+        if not sep or run in keep:
+            continue
+        if posixpath.basename(key) == index_name:
+            # a run index, of this project or of another one
+            keep.add(run)
+            runs.pop(run, None)
+            continue
+        runs.setdefault(run, []).append(key)
+        newest[run] = max(newest.get(run, modified), modified)
+    return {run: keys for run, keys in runs.items() if newest[run] < limit}
+
+
+def delete_objects(
+    keys: List[str],
+    delete_batch: Callable[[List[str]], int],
+    concurrency: int,
+    batch_size: int = DELETE_BATCH_SIZE,
+) -> int:
+    """Delete the keys in batches on a thread pool, return the number deleted."""
+    batches = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return sum(executor.map(delete_batch, batches))
+
+
+def collect_garbage(
+    objects: Iterable[Tuple[str, datetime.datetime]],
+    delete_batch: Callable[[List[str]], int],
+    days: int,
+    keep: Set[str],
+    concurrency: int,
+    dry_run: bool = False,
+    unindex: Optional[Callable[[Set[str]], None]] = None,
+) -> Tuple[int, int]:
+    """Delete the runs older than `days`, return the number of runs and of objects.
+
+    `unindex(runs)` then removes the deleted runs from the run index.
+    """
+    runs = expired_runs(objects, days, keep)
+    keys = [key for run_keys in runs.values() for key in run_keys]
+    if dry_run:
+        return len(runs), len(keys)
+    deleted = delete_objects(keys, delete_batch, concurrency)
+    if deleted < len(keys):
+        log.warning(f"{len(keys) - deleted} objects could not be deleted")
+    if unindex and runs:
+        unindex(set(runs))
+    return len(runs), deleted
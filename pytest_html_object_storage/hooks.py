@@ -0,0 +1,8 @@
+def pytest_html_object_storage_timings(config, backend, timings):
+    """Called when the report has been uploaded, with the timings of the upload phases.
+
+    :param config: the pytest config.
+    :param backend: the backend name, ``minio`` or ``swift``.
+    :param timings: the :class:`pytest_html_object_storage.metrics.Timings` of the
+        backend, see ``timings.summary()`` for the aggregation by phase.
+    """
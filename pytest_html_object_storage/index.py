@@ -0,0 +1,161 @@
+import datetime
+import html
+import json
+import logging
+import posixpath
+import random
+import time
+from string import Template
+from typing import Callable, Optional, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+# attempts to update the index when concurrent runs keep winning the race
+INDEX_ATTEMPTS = 10
+
+INDEX_PAGE = Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Test runs</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; font-size: 12px; margin: 2em; }
+th, td { padding: 2px 8px; text-align: left; }
+.failed { color: #d00; }
+</style>
+</head>
+<body>
+<h1>Test runs</h1>
+<table>
+<tr><th>Date (UTC)</th><th>Report</th><th>Duration</th><th>Outcomes</th></tr>
+$rows
+</table>
+</body>
+</html>
+"""
+)
+
+
+class IndexConflict(Exception):
+    """The index was modified by another run since it was read."""
+
+
+def index_keys(prefix: str) -> Tuple[str, str]:
+    """Return the keys of the JSON index and of its HTML page."""
+    return posixpath.join(prefix, "index.json"), posixpath.join(prefix, "index.html")
+
+
+def add_run(index: Optional[dict], entry: dict, size: int) -> dict:
+    runs = [run for run in (index or {}).get("runs", []) if run["name"] != entry["name"]]
+    return {"runs": ([entry] + runs)[:size]}
+
+
+def remove_runs(index: Optional[dict], runs: Set[str]) -> Optional[dict]:
+    """Remove the runs whose name starts with a `runs` prefix, None if there are none."""
+    entries = (index or {}).get("runs", [])
+    kept = [run for run in entries if run["name"].partition("/")[0] not in runs]
+    return {"runs": kept} if len(kept) < len(entries) else None
+
+
+def render_index(index: dict, prefix: str) -> str:
+    """Render the index page, linking to the reports relatively to `prefix`."""
+    up = "../" * len([part for part in prefix.split("/") if part])
+    rows = []
+    for run in index["runs"]:
+        outcomes = ", ".join(
+            f"{count} {outcome}" for outcome, count in sorted(run["outcomes"].items())
+        )
+        failed = run["outcomes"].get("failed") or run["outcomes"].get("error")
+        rows.append(
+            f'<tr class="{"failed" if failed else "passed"}">'
+            f"<td>{html.escape(run['timestamp'])}</td>"
+            f'<td><a href="{html.escape(up + run["name"])}">{html.escape(run["name"])}</a></td>'
+            f"<td>{run['duration']:.0f}s</td>"
+            f"<td>{html.escape(outcomes)}</td></tr>"
+        )
+    return INDEX_PAGE.substitute(rows="\n".join(rows))
+
+
+def _update(
+    read: Callable[[], Tuple[Optional[bytes], Optional[str]]],
+    write: Callable[[bytes, Optional[str]], None],
+    change: Callable[[Optional[dict]], Optional[dict]],
+    written: Callable[[dict], bool],
+    verify: bool,
+) -> Optional[dict]:
+    for attempt in range(INDEX_ATTEMPTS):
+        data, etag = read()
+        index = change(json.loads(data) if data else None)
+        if index is None:
+            return None
+        try:
+            write(json.dumps(index).encode(), etag)
+            if verify:
+                data, _ = read()
+                if not written(json.loads(data or b"{}")):
+                    raise IndexConflict()
+            return index
+        except IndexConflict:
+            delay = random.uniform(0, 0.1 * 2 ** attempt)
+            log.info(f"Run index updated by another run, retry in {delay:.2f}s")
+            time.sleep(delay)
+    raise IndexConflict(f"Run index still updated by other runs after {INDEX_ATTEMPTS} attempts")
+
+
+def update_index(
+    read: Callable[[], Tuple[Optional[bytes], Optional[str]]],
+    write: Callable[[bytes, Optional[str]], None],
+    entry: dict,
+    size: int,
+    verify: bool = False,
+) -> dict:
+    """Add the `entry` run to the index with an optimistic concurrency loop.
+
+    `read()` returns the index content and its ETag, (None, None) if it does
+    not exist yet. `write(data, etag)` writes only if the index still has
+    that ETag (or does not exist yet without ETag), else raises
+    `IndexConflict`. With `verify`, for stores without conditional updates,
+    the index is read back to check that the entry was not overwritten.
+    Keep the `size` most recent runs and return the written index.
+    """
+    return _update(
+        read,
+        write,
+        lambda index: add_run(index, entry, size),
+        lambda index: entry["name"] in [run["name"] for run in index.get("runs", [])],
+        verify,
+    )
+
+
+def prune_index(
+    read: Callable[[], Tuple[Optional[bytes], Optional[str]]],
+    write: Callable[[bytes, Optional[str]], None],
+    runs: Set[str],
+    verify: bool = False,
+) -> Optional[dict]:
+    """Remove the `runs` deleted by the garbage collection from the index.
+
+    Same concurrency loop as `update_index`. Return the written index, None
+    if the index has none of the runs.
+    """
+    return _update(
+        read,
+        write,
+        lambda index: remove_runs(index, runs),
+        lambda index: remove_runs(index, runs) is None,
+        verify,
+    )
+
+
+def run_entry(name: str, url: str, start: float, outcomes: dict, exitstatus: int) -> dict:
+    return {
+        "name": name,
+        "url": url,
+        "timestamp": datetime.datetime.fromtimestamp(
+            start, datetime.timezone.utc
+        ).strftime("%Y-%m-%d %H:%M:%S"),
+        "duration": time.time() - start,
+        "outcomes": dict(outcomes),
+        "exitstatus": int(exitstatus),
+    }
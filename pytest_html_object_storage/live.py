@@ -0,0 +1,199 @@
+import json
+import logging
+import posixpath
+import threading
+import time
+from string import Template
+from typing import Callable
+
+from _pytest.reports import TestReport
+
+log = logging.getLogger(__name__)
+
+# second unit, max wait for a publication in progress when the session ends
+STOP_TIMEOUT = 10
+
+# Served next to the report, never at its key: a late upload of the page
+# cannot replace the final report. It polls the progress payload next to it
+# and opens the report once the run is finished, or stops polling if the
+# final report could not be uploaded.
+PROGRESS_PAGE = Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Test run in progress</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; font-size: 12px; margin: 2em; }
+td { padding: 2px 8px; }
+.failed, .error { color: #d00; }
+</style>
+</head>
+<body>
+<h1>Test run in progress</h1>
+<p id="summary">Waiting for the first results...</p>
+<table id="failures"></table>
+<script>
+var interval = $interval * 1000;
+
+function render(progress) {
+  var done = 0;
+  var outcomes = [];
+  for (var outcome in progress.outcomes) {
+    done += progress.outcomes[outcome];
+    outcomes.push(progress.outcomes[outcome] + " " + outcome);
+  }
+  document.getElementById("summary").textContent =
+    done + "/" + progress.collected + " tests done: " + outcomes.join(", ") +
+    " (updated " + new Date(progress.updated * 1000).toLocaleTimeString() + ")";
+  var table = document.getElementById("failures");
+  table.textContent = "";
+  progress.failures.forEach(function (failure) {
+    var row = table.insertRow();
+    row.className = failure.outcome;
+    row.insertCell().textContent = failure.outcome;
+    row.insertCell().textContent = failure.nodeid;
+    row.insertCell().textContent = failure.duration.toFixed(2) + "s";
+  });
+}
+
+function refresh() {
+  fetch("progress.json?" + Date.now(), { cache: "no-store" })
+    .then(function (response) { return response.ok ? response.json() : null; })
+    .then(function (progress) {
+      if (progress && progress.state === "finished") {
+        location.replace("$report");
+        return;
+      }
+      if (progress && progress.state === "failed") {
+        render(progress);
+        document.querySelector("h1").textContent = "Test run finished, report upload failed";
+        return;
+      }
+      if (progress) {
+        render(progress);
+      }
+      setTimeout(refresh, interval);
+    })
+    .catch(function () { setTimeout(refresh, interval); });
+}
+
+refresh();
+</script>
+</body>
+</html>
+"""
+)
+
+
+def get_outcome(report: TestReport) -> str:
+    if report.failed and report.when != "call":
+        return "error"
+    if hasattr(report, "wasxfail"):
+        return "xpassed" if report.passed else "xfailed"
+    return report.outcome
+
+
+class LivePublisher:
+    """Publish the progress of the session while the tests run.
+
+    A static progress page is uploaded once next to the report `name`, then
+    only a compact JSON payload is republished from a background thread,
+    every `interval` seconds or every `every` tests, whichever comes first.
+    `send_data(name, data, content_type)` uploads one object.
+    """
+
+    def __init__(
+        self,
+        send_data: Callable[[str, bytes, str], None],
+        name: str,
+        interval: int,
+        every: int = 0,
+    ):
+        self.send_data = send_data
+        self.name = name
+        self.page_name = posixpath.join(posixpath.dirname(name), "live.html")
+        self.progress_name = posixpath.join(posixpath.dirname(name), "progress.json")
+        self.interval = interval
+        self.every = every
+        self.collected = 0
+        self._outcomes = {}
+        self._failures = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="pytest-html-object-storage-live", daemon=True
+        )
+
+    def start(self) -> "LivePublisher":
+        self._thread.start()
+        return self
+
+    def add(self, report: TestReport):
+        if report.when != "call" and report.passed:
+            return
+        outcome = get_outcome(report)
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            if outcome in ("failed", "error"):
+                self._failures.append(
+                    {
+                        "nodeid": report.nodeid,
+                        "outcome": outcome,
+                        "duration": report.duration,
+                    }
+                )
+            self._pending += 1
+            if self.every and self._pending >= self.every:
+                self._wake.set()
+
+    def payload(self, state: str = "running") -> bytes:
+        with self._lock:
+            self._pending = 0
+            return json.dumps(
+                {
+                    "state": state,
+                    "collected": self.collected,
+                    "outcomes": self._outcomes,
+                    "failures": self._failures,
+                    "updated": time.time(),
+                }
+            ).encode()
+
+    def _publish(self, name: str, data: bytes, content_type: str):
+        try:
+            self.send_data(name, data, content_type)
+        except Exception as e:
+            log.warning(f"Live report publish error: {e}")
+
+    def _run(self):
+        page = PROGRESS_PAGE.substitute(
+            interval=self.interval, report=posixpath.basename(self.name)
+        ).encode()
+        self._publish(self.page_name, page, "text/html")
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._pending and not self._stopped:
+                self._publish(self.progress_name, self.payload(), "application/json")
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """Stop publishing before the final report is uploaded.
+
+        A stalled publication is abandoned after `timeout` seconds.
+        """
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.warning(f"Live report publication still running after {timeout}s")
+
+    def finish(self):
+        """Tell the progress pages still open to open the final report."""
+        self._publish(self.progress_name, self.payload("finished"), "application/json")
+
+    def fail(self):
+        """Tell the progress pages still open that no final report will come."""
+        self._publish(self.progress_name, self.payload("failed"), "application/json")
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+log = logging.getLogger(__name__)
+
+PREFIX = "pytest_html_object_storage"
+
+
+class Timings:
+    """Duration and bytes transferred of each phase of the uploads of a backend.
+
+    Phases: client, auth, bucket_check, bucket_setup, assets, prepare, put.
+    """
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.spans: List[dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, phase: str, size: int = 0) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.spans.append(
+                    {
+                        "phase": phase,
+                        "seconds": time.perf_counter() - start,
+                        "bytes": size,
+                    }
+                )
+
+    def summary(self) -> Dict[str, dict]:
+        """Aggregate the spans by phase, in the order they first happened."""
+        phases = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            phase = phases.setdefault(
+                span["phase"], {"count": 0, "seconds": 0.0, "bytes": 0}
+            )
+            phase["count"] += 1
+            phase["seconds"] += span["seconds"]
+            phase["bytes"] += span["bytes"]
+        for phase in phases.values():
+            phase["throughput"] = (
+                phase["bytes"] / phase["seconds"] if phase["seconds"] else 0.0
+            )
+        return phases
+
+    def lines(self) -> List[str]:
+        lines = []
+        for name, phase in self.summary().items():
+            line = f"{name}: {phase['seconds']:.3f}s"
+            if phase["count"] > 1:
+                line += f" ({phase['count']} calls)"
+            if phase["bytes"]:
+                line += (
+                    f", {phase['bytes'] / 1024 ** 2:.2f} MiB"
+                    f" at {phase['throughput'] / 1024 ** 2:.2f} MiB/s"
+                )
+            lines.append(line)
+        return lines
+
+    def to_openmetrics(self) -> str:
+        summary = self.summary()
+        lines = []
+        for metric, key, help_text in (
+            ("phase_seconds", "seconds", "Time spent in each upload phase."),
+            ("phase_bytes", "bytes", "Bytes transferred in each upload phase."),
+            ("phase_calls", "count", "Number of calls of each upload phase."),
+        ):
+            lines.append(f"# HELP {PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{metric} gauge")
+            for name, phase in summary.items():
+                lines.append(
+                    f'{PREFIX}_{metric}{{backend="{self.backend}",phase="{name}"}} {phase[key]}'
+                )
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write the timings atomically: OpenMetrics text for `.prom` files, else JSON."""
+        if path.endswith(".prom"):
+            content = self.to_openmetrics()
+        else:
+            content = json.dumps(
+                {"backend": self.backend, "phases": self.summary(), "spans": self.spans},
+                indent=2,
+            )
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+
+
+def publish_timings(config, timings: Timings, path: str = None):
+    """Export the timings to `path` if any and pass them to the plugins subscribed to
+    the `pytest_html_object_storage_timings` hook."""
+    if path:
+        try:
+            timings.write(path)
+        except OSError as e:
+            log.warning(f"Cannot write the upload timings to {path}: {e}")
+    # the hook is only there in a pytest session
+    hook = getattr(config, "hook", None)
+    if hook:
+        hook.pytest_html_object_storage_timings(
+            config=config, backend=timings.backend, timings=timings
+        )
@@ -1,49 +1,86 @@
+import datetime
 import io
 import json
 import logging
 import os
-import uuid
-from typing import Union
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
 
-import pytest
-from _pytest.config import Config, ExitCode
-from _pytest.main import Session
-from _pytest.terminal import TerminalReporter
+import certifi
+import urllib3
+from _pytest.config import Config
 from minio import Minio
 from minio.commonconfig import ENABLED, Filter
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error, ServerError
 from minio.lifecycleconfig import Rule, Expiration, LifecycleConfig
+from urllib3.util import Timeout
+
+from pytest_html_object_storage.assets import content_type
+from pytest_html_object_storage.backend import HTMLObjectStorage, T
+from pytest_html_object_storage.bandwidth import ThrottledReader
+from pytest_html_object_storage.endpoints import EndpointRanking, get_endpoints
+from pytest_html_object_storage.index import IndexConflict, index_keys
+from pytest_html_object_storage.retry import DeadlineExceeded, remaining
+from pytest_html_object_storage.utils import env_int
 
 
 log = logging.getLogger(__name__)
 
 
-class HTMLMinio:
+class DeadlinePoolManager(urllib3.PoolManager):
+    """Keep-alive pool whose requests time out by the deadline of their upload."""
+
+    def __init__(self, request_timeout: float, **kwargs):
+        super().__init__(**kwargs)
+        self.request_timeout = request_timeout
+
+    def urlopen(self, method, url, redirect=True, **kw):
+        if "timeout" not in kw:
+            timeout = remaining(self.request_timeout)
+            kw["timeout"] = Timeout(connect=timeout, read=timeout)
+        return super().urlopen(method, url, redirect, **kw)
+
+
+class HTMLMinio(HTMLObjectStorage):
+    backend = "minio"
+    label = "Minio"
+    storage = "MinIO"
+
+
     def __init__(self, config: Config):
-        self.config = config
-        self.os_endpoint = os.environ.get("OBJECT_STORAGE_ENDPOINT")
-        self.os_bucket = os.environ.get("OBJECT_STORAGE_BUCKET")
-        self.os_username = os.environ.get("OBJECT_STORAGE_USERNAME")
-        self.os_password = os.environ.get("OBJECT_STORAGE_PASSWORD")
-        self.os_region_name = os.environ.get("OBJECT_STORAGE_REGION_NAME")
+        super().__init__(config)
+        self.os_endpoints = get_endpoints(self.os_endpoint)
+        # the fastest healthy endpoint once ranked, then the current one
+        self.os_endpoint = self.policy.endpoint = (
+            self.os_endpoints[0] if self.os_endpoints else None
+        )
         self.os_scheme, self.os_secure = self._get_secure()
-        self.os_retention = self._get_retention()
-        self.os_policy = self._get_policy()
         self.os_provider = os.environ.get("OBJECT_STORAGE_PROVIDER")
         self.os_http_report_url = os.environ.get("HTTP_REPORT_URL")
-        self.access_url = None
+        self.client = None
+        self.http_client = None
+        self.client_lock = threading.Lock()
+        self.endpoints = EndpointRanking(
+            self.os_endpoints,
+            self._probe,
+            env_int("OBJECT_STORAGE_ENDPOINT_CACHE_TTL", 300),
+        )
+        self.ranked_endpoints = None
 
 
     def get_access_url(self, name: str) -> str:
-        if self.os_http_report_url:
-            self.access_url = (
-                f"{self.os_scheme}://{self.os_http_report_url}/{name}"
-            )
-        else:
-            self.access_url = (
-                f"{self.os_scheme}://{self.os_endpoint}/{self.os_bucket}/{name}"
-            )
+        with self.client_lock:
+            self._rank_endpoints()
+        return super().get_access_url(name)
+
 
-        return self.access_url
+    def _object_url(self, name: str) -> str:
+        if self.os_http_report_url:
+            return f"{self.os_scheme}://{self.os_http_report_url}/{name}"
+        return f"{self.os_scheme}://{self.os_endpoint}/{self.os_bucket}/{name}"
 
 
     @staticmethod
@@ -63,101 +100,384 @@ class HTMLMinio:
             return 0
 
 
-    def _get_policy(self) -> str:
-        policy = os.environ.get("OBJECT_STORAGE_POLICY")
-        if not policy or policy == "public-read":
-            return "public-read"
-        else:
-            return ""
+    def _bootstrap_bucket(self, client: Minio):
+        with self.timings.span("bucket_check"):
+            found = client.bucket_exists(self.os_bucket)
+        if not found:
+            with self.timings.span("bucket_setup"):
+                self._create_bucket(client)
 
 
-    def send_html(self, name, contentfile: str):
-        client = Minio(
-            self.os_endpoint,
-            self.os_username,
-            self.os_password,
-            region=self.os_region_name,
-            secure=self.os_secure,
-        )
-        found = client.bucket_exists(self.os_bucket)
-        if not found:
-            client.make_bucket(self.os_bucket)
-            if self.os_policy == "public-read":
-                if not self.os_provider or self.os_provider == "scaleway":
-                    policy = {
-                        "Version": "2012-10-17",
-                        "Id": f"{self.os_bucket}Policy",
-                        "Statement": [
-                            {
-                                "Sid": "Grant List and GET to everyone",
-                                "Effect": "Allow",
-                                "Principal": "*",
-                                "Action": ["s3:ListBucket", "s3:GetObject"],
-                                "Resource": [self.os_bucket, f"{self.os_bucket}/*"],
-                            }
-                        ],
-                    }
-                else:
-                    policy = {
-                        "Version": "2012-10-17",
-                        "Statement": [
-                            {
-                                "Effect": "Allow",
-                                "Principal": {"AWS": "*"},
-                                "Action": ["s3:GetBucketLocation", "s3:ListBucket"],
-                                "Resource": f"arn:aws:s3:::{self.os_bucket}",
-                            },
-                            {
-                                "Effect": "Allow",
-                                "Principal": {"AWS": "*"},
-                                "Action": "s3:GetObject",
-                                "Resource": f"arn:aws:s3:::{self.os_bucket}/*",
-                            },
-                        ],
-                    }
-                client.set_bucket_policy(self.os_bucket, json.dumps(policy))
-            if self.os_retention:
-                config = LifecycleConfig(
-                    [
-                        Rule(
-                            ENABLED,
-                            rule_filter=Filter(prefix="*/"),
-                            rule_id="rule_retention",
-                            expiration=Expiration(days=self.os_retention),
-                        ),
+    def _create_bucket(self, client: Minio):
+        client.make_bucket(self.os_bucket)
+        if self.os_policy == "public-read":
+            if not self.os_provider or self.os_provider == "scaleway":
+                policy = {
+                    "Version": "2012-10-17",
+                    "Id": f"{self.os_bucket}Policy",
+                    "Statement": [
+                        {
+                            "Sid": "Grant List and GET to everyone",
+                            "Effect": "Allow",
+                            "Principal": "*",
+                            "Action": ["s3:ListBucket", "s3:GetObject"],
+                            "Resource": [self.os_bucket, f"{self.os_bucket}/*"],
+                        }
                     ],
-                )
-                client.set_bucket_lifecycle(self.os_bucket, config)
-        client.fput_object(
-            self.os_bucket,
+                }
+            else:
+                policy = {
+                    "Version": "2012-10-17",
+                    "Statement": [
+                        {
+                            "Effect": "Allow",
+                            "Principal": {"AWS": "*"},
+                            "Action": ["s3:GetBucketLocation", "s3:ListBucket"],
+                            "Resource": f"arn:aws:s3:::{self.os_bucket}",
+                        },
+                        {
+                            "Effect": "Allow",
+                            "Principal": {"AWS": "*"},
+                            "Action": "s3:GetObject",
+                            "Resource": f"arn:aws:s3:::{self.os_bucket}/*",
+                        },
+                    ],
+                }
+            client.set_bucket_policy(self.os_bucket, json.dumps(policy))
+        if self.os_retention:
+            config = LifecycleConfig(
+                [
+                    Rule(
+                        ENABLED,
+                        rule_filter=Filter(prefix="*/"),
+                        rule_id="rule_retention",
+                        expiration=Expiration(days=self.os_retention),
+                    ),
+                ],
+            )
+            client.set_bucket_lifecycle(self.os_bucket, config)
+
+
+    def _fput_object(self, client: Minio, key: str, path: str, **kwargs):
+        """fput_object(), within the host bandwidth if limited."""
+        if not self.bandwidth:
+            client.fput_object(self.os_bucket, key, path, **kwargs)
+            return
+        with open(path, "rb") as f:
+            client.put_object(
+                self.os_bucket,
+                key,
+                ThrottledReader(f, self.bandwidth),
+                os.path.getsize(path),
+                **kwargs,
+            )
+
+
+    def _put_report(self, client: Minio, name: str, path: str, encoding: str = None):
+        with self.timings.span("put", os.path.getsize(path)):
+            self._fput_object(
+                client,
+                name,
+                path,
+                content_type="text/html",
+                metadata={"Content-Encoding": encoding} if encoding else None,
+                part_size=self.os_part_size,
+                num_parallel_uploads=self.os_concurrency,
+            )
+
+
+    def _object_exists(self, client: Minio, key: str) -> bool:
+        try:
+            client.stat_object(self.os_bucket, key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
+
+
+    def _put_file(self, client: Minio, key: str, path: str):
+        with self.timings.span("put", os.path.getsize(path)):
+            self._fput_object(
+                client,
+                key,
+                path,
+                content_type=content_type(path),
+                part_size=self.os_part_size,
+            )
+
+
+    def _send_report(
+        self, client: Minio, name: str, contentfile: str, self_contained: bool
+    ):
+        pipeline = self._pipeline(
             name,
-            contentfile,
-            content_type="text/html",
+            lambda key: self._object_exists(client, key),
+            lambda key, path: self._put_file(client, key, path),
+            self_contained,
+        )
+        with pipeline.prepare(contentfile) as (path, encoding):
+            self._put_report(client, name, path, encoding)
+
+
+    def _get_http_client(self) -> urllib3.PoolManager:
+        return DeadlinePoolManager(
+            self.os_timeout,
+            maxsize=self.os_pool_size,
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            # retried by the upload policy, within the upload deadline
+            retries=False,
         )
 
 
-    @pytest.hookimpl(trylast=True, hookwrapper=True)
-    def pytest_sessionfinish(self, session, exitstatus):
-        outcome = yield
-        htmlfile = getattr(session.config.option, "htmlpath", None)
-        if htmlfile:
-            name = f"{str(uuid.uuid4())}/report.html"
+    def _probe(self, endpoint: str):
+        """Cheap request: any answer but a server error is healthy."""
+        timeout = env_int("OBJECT_STORAGE_PROBE_TIMEOUT", 2)
+        http = urllib3.PoolManager(
+            timeout=Timeout(connect=timeout, read=timeout),
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=False,
+        )
+        try:
+            response = http.request(
+                "HEAD", f"{self.os_scheme}://{endpoint}/", redirect=False
+            )
+        finally:
+            http.clear()
+        if response.status >= 500:
+            raise ServerError(f"HTTP {response.status}", response.status)
+
+
+    def _rank_endpoints(self) -> List[str]:
+        """Rank the endpoints once and use the fastest, with `client_lock` held."""
+        if self.ranked_endpoints is None:
+            if len(self.os_endpoints) > 1:
+                self.ranked_endpoints = self.endpoints.rank()
+            else:
+                self.ranked_endpoints = self.os_endpoints
+            self.os_endpoint = self.policy.endpoint = self.ranked_endpoints[0]
+        return self.ranked_endpoints
+
+
+    def _fail_over(self, endpoint: str) -> Optional[str]:
+        """Switch from the failed `endpoint` to the next one, return it."""
+        with self.client_lock:
+            ranked = self._rank_endpoints()
+            if self.os_endpoint != endpoint:
+                # already switched by another upload
+                return self.os_endpoint
+            index = ranked.index(endpoint) + 1
+            if index == len(ranked):
+                return None
+            self.endpoints.invalidate()
+            self.os_endpoint = self.policy.endpoint = ranked[index]
+            # the uploads still running keep the pool of the failed endpoint
+            self.client = self.http_client = None
+            return self.os_endpoint
+
+
+    def _run(self, call: Callable[[], T], size: int = 0, hedge: bool = False) -> T:
+        """Run `call` with the upload policy, failing over to the next endpoints.
+
+        The endpoints share the deadline of the upload. The server errors are
+        retried on the endpoint first, the connection errors and timeouts fail
+        over at once: a hanging endpoint would use the whole deadline.
+        """
+        end = self.policy.end()
+        tried = set()
+        while True:
+            with self.client_lock:
+                ranked = self._rank_endpoints()
+                endpoint = self.os_endpoint
+            retryable = self._is_retryable
+            if ranked.index(endpoint) < len(ranked) - 1:
+                # the next endpoint is tried at once
+                retryable = self._is_server_error
             try:
-                self.send_html(
+                return self.policy.run(call, size, hedge, end, retryable)
+            except Exception as e:
+                tried.add(endpoint)
+                if (
+                    isinstance(e, DeadlineExceeded)
+                    or not self._is_retryable(e)
+                    or (end and time.monotonic() >= end)
+                ):
+                    raise
+                next_endpoint = self._fail_over(endpoint)
+                if next_endpoint is None or next_endpoint in tried:
+                    raise
+                log.warning(f"Minio endpoint {endpoint} failed, using {next_endpoint}: {e}")
+
+
+    def _get_client(self) -> Minio:
+        """Return the client of the plugin, sharing one keep-alive pool per endpoint."""
+        with self.client_lock:
+            if self.client is None:
+                self._rank_endpoints()
+                with self.timings.span("client"):
+                    self.http_client = self._get_http_client()
+                    self.client = Minio(
+                        self.os_endpoint,
+                        self.os_username,
+                        self.os_password,
+                        region=self.os_region_name,
+                        secure=self.os_secure,
+                        http_client=self.http_client,
+                    )
+            return self.client
+
+
+    def close(self):
+        with self.client_lock:
+            if self.http_client:
+                self.http_client.clear()
+            self.client = self.http_client = None
+
+
+    def _send(self, client: Minio, send: Callable[[], None]):
+        key = f"{self.os_endpoint}/{self.os_bucket}"
+        if not self.bucket_cache.get(key):
+            self._bootstrap_bucket(client)
+            self.bucket_cache.set(key, True)
+        try:
+            send()
+        except S3Error as e:
+            if e.code != "NoSuchBucket":
+                raise
+            log.info(f"Bucket {self.os_bucket} does not exist anymore")
+            self.bucket_cache.delete(key)
+            self._bootstrap_bucket(client)
+            self.bucket_cache.set(key, True)
+            send()
+
+
+    @staticmethod
+    def _is_retryable(e: Exception) -> bool:
+        if isinstance(e, S3Error):
+            return e.code in (
+                "InternalError",
+                "RequestTimeout",
+                "ServiceUnavailable",
+                "SlowDown",
+            )
+        # not the other OSError: a missing or unreadable file fails at once
+        return isinstance(
+            e,
+            (ServerError, urllib3.exceptions.HTTPError, ConnectionError, TimeoutError),
+        )
+
+
+    @staticmethod
+    def _is_server_error(e: Exception) -> bool:
+        """Retryable error answered by the endpoint, not a connection error or timeout."""
+        return HTMLMinio._is_retryable(e) and not isinstance(
+            e, (urllib3.exceptions.HTTPError, ConnectionError, TimeoutError)
+        )
+
+
+    def _send_html(self, name: str, contentfile: str, self_contained: bool):
+        client = self._get_client()
+        self._send(
+            client, lambda: self._send_report(client, name, contentfile, self_contained)
+        )
+
+
+    def _send_data(self, name: str, data: bytes, content_type: str):
+        client = self._get_client()
+
+        def put():
+            with self.timings.span("put", len(data)):
+                client.put_object(
+                    self.os_bucket,
                     name,
-                    htmlfile,
+                    io.BytesIO(data),
+                    len(data),
+                    content_type=content_type,
                 )
-                session.config._report_url = self.get_access_url(name)
-            except Exception as e:
-                log.error(f"Minio send_html error: {self.os_endpoint} - {e}")
+
+        self._send(client, put)
+
+
+    def _send_file(self, key: str, path: str):
+        client = self._get_client()
+        self._send(client, lambda: self._put_file(client, key, path))
 
 
-    def pytest_terminal_summary(
-        self,
-        terminalreporter: TerminalReporter,
-        exitstatus: Union[int, ExitCode],
-        config: Config,
+    def _read_object(self, client: Minio, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        try:
+            response = client.get_object(self.os_bucket, key)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None, None
+            raise
+        try:
+            return response.read(), response.headers.get("ETag")
+        finally:
+            response.close()
+            response.release_conn()
+
+
+    def _write_object(
+        self, client: Minio, key: str, data: bytes, content_type: str, etag: str = None
     ):
-        terminalreporter.write_sep(
-            "-", f"HTML report sent on MinIO object storage at {self.access_url}"
+        """Write the object only if it still has `etag`, or does not exist without."""
+        headers = {"Content-Type": content_type}
+        if etag:
+            headers["If-Match"] = etag
+        else:
+            headers["If-None-Match"] = "*"
+        try:
+            # put_object() would send the conditional headers as user metadata
+            client._put_object(self.os_bucket, key, data, headers)
+        except S3Error as e:
+            if e.code in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise IndexConflict() from e
+            raise
+
+
+    @contextmanager
+    def _index_object(self) -> Iterator[Tuple[Callable, Callable]]:
+        client = self._get_client()
+        key, _ = index_keys(self.os_index_prefix)
+        yield (
+            lambda: self._read_object(client, key),
+            lambda data, etag: self._write_object(
+                client, key, data, "application/json", etag
+            ),
+        )
+
+
+    def _send_index_page(self, key: str, data: bytes):
+        self.send_data(key, data, "text/html")
+
+
+    def _list_objects(self, prefix: str) -> List[str]:
+        client = self._get_client()
+        return [
+            obj.object_name
+            for obj in client.list_objects(self.os_bucket, prefix=prefix, recursive=True)
+        ]
+
+
+    def _get_object(self, key: str) -> bytes:
+        data, _ = self._read_object(self._get_client(), key)
+        if data is None:
+            raise FileNotFoundError(key)
+        return data
+
+
+    def _list_all(self) -> Iterator[Tuple[str, datetime.datetime]]:
+        client = self._get_client()
+        for obj in client.list_objects(self.os_bucket, recursive=True):
+            yield obj.object_name, obj.last_modified
+
+
+    def _delete_batch(self, keys: List[str]) -> int:
+        client = self._get_client()
+        # remove_objects() is lazy: the errors are returned once consumed
+        errors = list(
+            client.remove_objects(self.os_bucket, [DeleteObject(key) for key in keys])
         )
+        for error in errors:
+            log.warning(f"Cannot delete {error.name}: {error.message}")
+        return len(keys) - len(errors)
@@ -0,0 +1,61 @@
+import os
+from typing import Callable, List, Tuple
+
+from pytest_html_object_storage.background import daemon_map
+
+MiB = 1024 * 1024
+
+
+class FileSegment:
+    """Read-only file-like view on `length` bytes of a file starting at `offset`."""
+
+    def __init__(self, path: str, offset: int, length: int):
+        self.length = length
+        self._remaining = length
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def split(size: int, part_size: int) -> List[Tuple[int, int, int]]:
+    """Return the (index, offset, length) of each part of a `size` bytes file."""
+    return [
+        (index, offset, min(part_size, size - offset))
+        for index, offset in enumerate(range(0, size, part_size), start=1)
+    ]
+
+
+def upload_parts(
+    path: str,
+    part_size: int,
+    concurrency: int,
+    upload_part: Callable[[int, FileSegment], str],
+) -> List[Tuple[int, int, str]]:
+    """Upload the parts of `path` on daemon worker threads.
+
+    `upload_part(index, segment)` sends one part and returns its etag.
+    Return the (index, length, etag) of each part, in order.
+    """
+
+    def _upload(part):
+        index, offset, length = part
+        with FileSegment(path, offset, length) as segment:
+            return index, length, upload_part(index, segment)
+
+    parts = split(os.path.getsize(path), part_size)
+    return daemon_map(_upload, parts, concurrency)
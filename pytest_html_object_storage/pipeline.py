@@ -0,0 +1,256 @@
+import base64
+import binascii
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+from pytest_html_object_storage.assets import collect_assets, upload_missing
+from pytest_html_object_storage.compression import ENCODINGS, get_compressor
+from pytest_html_object_storage.metrics import Timings
+from pytest_html_object_storage.multipart import MiB
+
+log = logging.getLogger(__name__)
+
+DATA_URI = b"data:"
+DATA_URI_HEADER = re.compile(rb"data:([\w.+-]+/[\w.+-]+)(?:;[\w.+-]+=[\w.+-]+)*;base64,")
+# longest data URI header waited for before giving up on a "data:" match
+DATA_URI_HEADER_MAX = 256
+BASE64 = re.compile(rb"[A-Za-z0-9+/=]*")
+
+
+class _Blob:
+    """Temporary file receiving the decoded content of a data URI."""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp()
+        self._file = os.fdopen(fd, "wb")
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._digest.update(data)
+
+    def close(self) -> str:
+        self._file.close()
+        return self._digest.hexdigest()
+
+    def restore(self, write: Callable[[bytes], None], header: bytes):
+        """Write back the data URI decoded so far and remove the file."""
+        self._file.close()
+        write(header)
+        with open(self.path, "rb") as f:
+            # a multiple of 3 bytes: encoded without padding
+            for chunk in iter(lambda: f.read(3 * 256 * 1024), b""):
+                write(base64.b64encode(chunk))
+        os.remove(self.path)
+
+
+def rewrite(
+    src: BinaryIO,
+    write: Callable[[bytes], None],
+    replacements: Dict[str, str],
+    data_uri_threshold: int,
+    up: str,
+    prefix: str,
+) -> Dict[str, str]:
+    """Stream the report from `src` to `write`, rewriting it on the way.
+
+    The `replacements` paths are replaced, and the base64 data URIs of more
+    than `data_uri_threshold` bytes (0 to keep them all) are decoded chunk
+    by chunk to temporary files named after the hash of their content, and
+    replaced by `up` + their key under `prefix`. The data URIs whose base64
+    is invalid are kept unchanged. Return {key: blob path}.
+    """
+    markers = sorted((path.encode() for path in replacements), key=len, reverse=True)
+    if data_uri_threshold:
+        markers.append(DATA_URI)
+    if not markers:
+        for chunk in iter(lambda: src.read(MiB), b""):
+            write(chunk)
+        return {}
+    pattern = re.compile(b"|".join(re.escape(marker) for marker in markers))
+    longest = max(max(len(marker) for marker in markers), DATA_URI_HEADER_MAX)
+    replacements = {path.encode(): value.encode() for path, value in replacements.items()}
+    encoded_threshold = data_uri_threshold * 4 // 3
+    blobs = {}
+    buffer = b""
+    # position in the buffer of what is not written yet
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = src.read(MiB)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    fill()
+    while True:
+        match = pattern.search(buffer, pos)
+        if not eof and (match is None or match.start() + longest > len(buffer)):
+            # a marker or a data URI header may continue in the next chunk
+            keep = max(len(buffer) - longest, match.start() if match else 0, pos)
+            write(buffer[pos:keep])
+            pos = keep
+            fill()
+            continue
+        if match is None:
+            write(buffer[pos:])
+            break
+        write(buffer[pos:match.start()])
+        pos = match.start()
+        if match.group(0) != DATA_URI:
+            write(replacements[match.group(0)])
+            pos = match.end()
+            continue
+        header = DATA_URI_HEADER.match(buffer, pos)
+        if not header:
+            write(buffer[pos:pos + 1])
+            pos += 1
+            continue
+        pos = header.end()
+        payload = bytearray()
+        blob = None
+        # invalid base64: the rest of the data URI is written unchanged
+        invalid = False
+        while True:
+            end = BASE64.match(buffer, pos).end()
+            payload += buffer[pos:end]
+            pos = end
+            if pos < len(buffer) or eof:
+                break
+            if blob is None and not invalid and len(payload) > encoded_threshold:
+                blob = _Blob()
+            if blob:
+                aligned = len(payload) // 4 * 4
+                try:
+                    blob.write(base64.b64decode(payload[:aligned]))
+                    del payload[:aligned]
+                except binascii.Error as e:
+                    log.warning(f"Data URI kept in the report: {e}")
+                    blob.restore(write, header.group(0))
+                    blob = None
+                    invalid = True
+            if invalid:
+                write(payload)
+                payload.clear()
+            fill()
+        if invalid:
+            write(payload)
+            continue
+        if blob is None and len(payload) <= encoded_threshold:
+            write(header.group(0) + payload)
+            continue
+        blob = blob or _Blob()
+        try:
+            blob.write(base64.b64decode(payload))
+        except binascii.Error as e:
+            log.warning(f"Data URI kept in the report: {e}")
+            blob.restore(write, header.group(0))
+            write(payload)
+            continue
+        extension = mimetypes.guess_extension(header.group(1).decode()) or ""
+        key = f"{prefix}/{blob.close()}{extension}"
+        if key in blobs:
+            os.remove(blob.path)
+        else:
+            blobs[key] = blob.path
+        write((up + key).encode())
+    return blobs
+
+
+class ReportPipeline:
+    """Prepare the report written by pytest-html for its upload, for both backends.
+
+    The report is read once: its shared assets are uploaded first, then one
+    streaming pass rewrites their paths, extracts the large data URIs and
+    compresses the result into the single temporary file uploaded. Reports
+    needing none of that are uploaded directly.
+    `exists(key)` and `put(key, path)` store the assets and data URIs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        exists: Callable[[str], bool],
+        put: Callable[[str, str], None],
+        timings: Timings,
+        concurrency: int,
+        assets_prefix: str,
+        shared_assets: bool = False,
+        data_uri_threshold: int = 0,
+        compression: Optional[str] = None,
+        compression_threshold: int = 0,
+    ):
+        self.name = name
+        self.exists = exists
+        self.put = put
+        self.timings = timings
+        self.concurrency = concurrency
+        self.assets_prefix = assets_prefix
+        self.shared_assets = shared_assets
+        self.data_uri_threshold = data_uri_threshold
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+
+    def _upload(self, objects: Dict[str, str], kind: str):
+        uploaded, skipped = upload_missing(
+            list(objects.items()), self.exists, self.put, self.concurrency
+        )
+        log.info(f"{kind}: {uploaded} uploaded, {skipped} already stored")
+
+    @contextmanager
+    def prepare(self, report_path: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Yield the path of the file to upload and its Content-Encoding."""
+        up = "../" * self.name.count("/")
+        replacements = {}
+        if self.shared_assets:
+            with self.timings.span("assets"):
+                assets = collect_assets(report_path, self.assets_prefix)
+                self._upload(dict(assets.values()), "Assets")
+            replacements = {relative: up + key for relative, (key, _) in assets.items()}
+        compress = (
+            self.compression
+            and os.path.getsize(report_path) >= self.compression_threshold
+        )
+        if not (replacements or self.data_uri_threshold or compress):
+            yield report_path, None
+            return
+
+        blobs = {}
+        fd, path = tempfile.mkstemp(suffix=f".{self.compression}" if compress else ".html")
+        try:
+            with self.timings.span("prepare"):
+                with open(report_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                    if compress:
+                        compressor = get_compressor(self.compression)
+
+                        def write(data: bytes):
+                            dst.write(compressor.compress(data))
+
+                    else:
+                        write = dst.write
+                    blobs = rewrite(
+                        src,
+                        write,
+                        replacements,
+                        self.data_uri_threshold,
+                        up,
+                        self.assets_prefix,
+                    )
+                    if compress:
+                        dst.write(compressor.flush())
+            if blobs:
+                with self.timings.span("assets"):
+                    self._upload(blobs, "Data URIs")
+            yield path, ENCODINGS[self.compression] if compress else None
+        finally:
+            os.remove(path)
+            for blob in blobs.values():
+                os.remove(blob)
@@ -1,77 +1,93 @@
+import functools
 import os
+from importlib.metadata import EntryPoint, entry_points
+from typing import Dict
+
 import pytest
 
-from _pytest.config import Config
+from _pytest.config import Config, PytestPluginManager
 from _pytest.config.argparsing import Parser
 
-from pytest_html_object_storage.minio import HTMLMinio
-from pytest_html_object_storage.swift import HTMLSwift
+from pytest_html_object_storage.utils import env_bool
+
+BACKENDS_GROUP = "pytest_html_object_storage.backends"
+
+# also registered in setup.py, available when the package metadata is not installed
+BUILTIN_BACKENDS = {
+    "minio": "pytest_html_object_storage.minio:HTMLMinio",
+    "swift": "pytest_html_object_storage.swift:HTMLSwift",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_backends() -> Dict[str, EntryPoint]:
+    """Return the backends by name, without importing them.
+
+    The installed distributions are scanned once per process.
+    """
+    backends = {
+        name: EntryPoint(name, value, BACKENDS_GROUP)
+        for name, value in BUILTIN_BACKENDS.items()
+    }
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        group = eps.select(group=BACKENDS_GROUP)
+    else:
+        group = eps.get(BACKENDS_GROUP, [])
+    for ep in group:
+        backends[ep.name] = ep
+    return backends
+
+
+def pytest_addhooks(pluginmanager: PytestPluginManager):
+    from pytest_html_object_storage import hooks
+
+    pluginmanager.add_hookspecs(hooks)
 
 
 def pytest_addoption(parser: Parser):
-    parser.addoption(
-        "--store-minio",
-        action="store_true",
-        help="send HTML report via MinIO",
-    )
-    parser.addoption(
-        "--store-swift",
-        action="store_true",
-        help="send HTML report via Swift",
-    )
+    for name in get_backends():
+        parser.addoption(
+            f"--store-{name}",
+            action="store_true",
+            help=f"send HTML report via {name}",
+        )
 
 
 @pytest.hookimpl(tryfirst=True)
 def pytest_configure(config: Config):
-    if config.getoption("--store-minio") and not hasattr(config, "workerinput"):
+    if hasattr(config, "workerinput"):
+        return
+    for name, ep in get_backends().items():
+        if not config.getoption(f"--store-{name}"):
+            continue
         if not (
-            config.getoption("--html") and config.getoption("--self-contained-html")
-        ):
-            raise Exception(
-                """ You must configure pytest-hmtl to generate a self-contained report "--html=<path_to_the_report>" and "--self-contained-html" """
-            )
-        if (
-            not os.environ.get("OBJECT_STORAGE_ENDPOINT")
-            or not os.environ.get("OBJECT_STORAGE_BUCKET")
-            or not os.environ.get("OBJECT_STORAGE_USERNAME")
-            or not os.environ.get("OBJECT_STORAGE_PASSWORD")
-        ):
-            raise Exception(
-                "You must set the environment variables for html_minio plugin"
+            config.getoption("--html")
+            and (
+                config.getoption("--self-contained-html")
+                or env_bool("OBJECT_STORAGE_SHARED_ASSETS")
             )
-        config._html_minio = HTMLMinio(config)
-        config.pluginmanager.register(config._html_minio, "pytest-html-object-storage")
-
-    if config.getoption("--store-swift") and not hasattr(config, "workerinput"):
-        if not (
-            config.getoption("--html") and config.getoption("--self-contained-html")
         ):
             raise Exception(
-                """ You must configure pytest-hmtl to generate a self-contained report "--html" and "--self-contained-html"""
+                """ You must configure pytest-hmtl to generate a self-contained report """
+                """"--html=<path_to_the_report>" and "--self-contained-html" """
+                """(or set OBJECT_STORAGE_SHARED_ASSETS="true") """
             )
-        if (
-            not os.environ.get("OBJECT_STORAGE_ENDPOINT")
-            or not os.environ.get("OBJECT_STORAGE_BUCKET")
-            or not os.environ.get("OBJECT_STORAGE_USERNAME")
-            or not os.environ.get("OBJECT_STORAGE_PASSWORD")
-            or not os.environ.get("OBJECT_STORAGE_TENANT_ID")
-            or not os.environ.get("OBJECT_STORAGE_TENANT_NAME")
-            or not os.environ.get("OBJECT_STORAGE_REGION_NAME")
-        ):
+        # imported only when selected: the clients are slow to import
+        backend_class = ep.load()
+        if not all(os.environ.get(var) for var in backend_class.required_env):
             raise Exception(
-                "You must set the environment variables for html_swift plugin"
+                f"You must set the environment variables for html_{name} plugin"
             )
-        config._html_swift = HTMLSwift(config)
-        config.pluginmanager.register(config._html_swift)
+        backend = backend_class(config)
+        setattr(config, f"_html_{name}", backend)
+        config.pluginmanager.register(backend, f"pytest-html-object-storage-{name}")
 
 
 def pytest_unconfigure(config: Config):
-    html_minio = getattr(config, "_html_minio", None)
-    if html_minio:
-        del config._html_minio
-        config.pluginmanager.unregister(html_minio)
-
-    html_swift = getattr(config, "_html_swift", None)
-    if html_swift:
-        del config._html_swift
-        config.pluginmanager.unregister(html_swift)
+    for name in get_backends():
+        backend = getattr(config, f"_html_{name}", None)
+        if backend:
+            delattr(config, f"_html_{name}")
+            backend.close()
+            config.pluginmanager.unregister(backend)
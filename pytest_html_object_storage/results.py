@@ -0,0 +1,224 @@
+import gzip
+import json
+import logging
+import posixpath
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from _pytest.reports import TestReport
+
+from pytest_html_object_storage.live import get_outcome
+
+log = logging.getLogger(__name__)
+
+RESULTS_FILE = "results.bin.gz"
+MAGIC = b"PHOSR1\n"
+HEADER_SIZE = struct.Struct("<I")
+# (name, typecode) of the columns, stored little-endian in this order
+COLUMNS = (("test", "I"), ("phase", "B"), ("outcome", "B"), ("duration", "d"))
+
+
+def results_key(name: str) -> str:
+    """Key of the results uploaded next to the report `name`."""
+    return posixpath.join(posixpath.dirname(name), RESULTS_FILE)
+
+
+def _code(dictionary: Dict[str, int], value: str) -> int:
+    return dictionary.setdefault(value, len(dictionary))
+
+
+def _to_bytes(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+class ResultsRecorder:
+    """Results of the session in columns, filled from the test reports.
+
+    One row per phase (setup, call, teardown) of each test: the node ids,
+    phases and outcomes are dictionary encoded, the durations are floats.
+    """
+
+    def __init__(self):
+        self.nodeids = {}
+        self.phases = {}
+        self.outcomes = {}
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def add(self, report: TestReport):
+        self.columns["test"].append(_code(self.nodeids, report.nodeid))
+        self.columns["phase"].append(_code(self.phases, report.when))
+        self.columns["outcome"].append(_code(self.outcomes, get_outcome(report)))
+        self.columns["duration"].append(report.duration)
+
+    def payload(self, name: str, start: float, exitstatus: int) -> bytes:
+        """Gzipped JSON header (run, dictionaries) followed by the packed columns."""
+        header = json.dumps(
+            {
+                "name": name,
+                "start": start,
+                "duration": time.time() - start,
+                "exitstatus": int(exitstatus),
+                "nodeids": list(self.nodeids),
+                "phases": list(self.phases),
+                "outcomes": list(self.outcomes),
+                "rows": len(self.columns["test"]),
+            },
+            separators=(",", ":"),
+        ).encode()
+        return gzip.compress(
+            b"".join(
+                [MAGIC, HEADER_SIZE.pack(len(header)), header]
+                + [_to_bytes(self.columns[name]) for name, _ in COLUMNS]
+            )
+        )
+
+
+def read_payload(data: bytes) -> Tuple[dict, Dict[str, array]]:
+    """Return the header and the columns of a results payload."""
+    data = gzip.decompress(data)
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a results payload")
+    offset = len(MAGIC)
+    (size,) = HEADER_SIZE.unpack_from(data, offset)
+    offset += HEADER_SIZE.size
+    header = json.loads(data[offset:offset + size])
+    offset += size
+    columns = {}
+    for name, typecode in COLUMNS:
+        length = header["rows"] * array(typecode).itemsize
+        columns[name] = _from_bytes(typecode, data[offset:offset + length])
+        offset += length
+    return header, columns
+
+
+def percentile(values: array, q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+class ResultsTable:
+    """Results of many runs concatenated in columns, for percentile and trend queries.
+
+    `runs` are the headers of the runs (name, start, duration, exitstatus)
+    ordered by start, the `run` column is the index of the run of each row.
+    """
+
+    def __init__(self):
+        self.runs = []
+        self.nodeids = {}
+        self.phases = {}
+        self.outcomes = {}
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+        self.columns["run"] = array("I")
+
+    def add(self, header: dict, columns: Dict[str, array]):
+        run = len(self.runs)
+        self.runs.append(
+            {key: header[key] for key in ("name", "start", "duration", "exitstatus")}
+        )
+        # translate the codes of the run to the dictionaries of the table
+        for column, key, dictionary in (
+            ("test", "nodeids", self.nodeids),
+            ("phase", "phases", self.phases),
+            ("outcome", "outcomes", self.outcomes),
+        ):
+            codes = [_code(dictionary, value) for value in header[key]]
+            self.columns[column].extend(codes[code] for code in columns[column])
+        self.columns["duration"].extend(columns["duration"])
+        self.columns["run"].extend([run] * header["rows"])
+
+    def rows(
+        self, nodeid: str = None, phase: str = "call", outcome: str = None
+    ) -> Iterator[int]:
+        """Indexes of the rows of `nodeid` (all the tests if None) for `phase`."""
+        test = self.nodeids.get(nodeid, -1) if nodeid else None
+        phase_code = self.phases.get(phase, -1)
+        outcome_code = self.outcomes.get(outcome, -1) if outcome else None
+        tests = self.columns["test"]
+        phases = self.columns["phase"]
+        outcomes = self.columns["outcome"]
+        for row in range(len(tests)):
+            if (
+                phases[row] == phase_code
+                and (test is None or tests[row] == test)
+                and (outcome_code is None or outcomes[row] == outcome_code)
+            ):
+                yield row
+
+    def durations(self, nodeid: str, phase: str = "call") -> array:
+        """Durations of `nodeid` in the order of the runs."""
+        duration = self.columns["duration"]
+        return array("d", (duration[row] for row in self.rows(nodeid, phase)))
+
+    def percentile(self, nodeid: str, q: float, phase: str = "call") -> Optional[float]:
+        """`q`th percentile (0 to 100, linear interpolation) of the durations of `nodeid`."""
+        return percentile(self.durations(nodeid, phase), q)
+
+    def trend(self, nodeid: str, phase: str = "call") -> List[Tuple[float, float]]:
+        """(run start, duration) of `nodeid` for each run, oldest first."""
+        run = self.columns["run"]
+        duration = self.columns["duration"]
+        return [
+            (self.runs[run[row]]["start"], duration[row])
+            for row in self.rows(nodeid, phase)
+        ]
+
+    def slowest(
+        self, q: float = 50, count: int = 10, phase: str = "call"
+    ) -> List[Tuple[str, float]]:
+        """The `count` tests with the highest `q`th percentile duration."""
+        durations = {}
+        tests = self.columns["test"]
+        duration = self.columns["duration"]
+        for row in self.rows(phase=phase):
+            durations.setdefault(tests[row], array("d")).append(duration[row])
+        nodeids = list(self.nodeids)
+        ranked = sorted(
+            ((nodeids[test], percentile(values, q)) for test, values in durations.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return ranked[:count]
+
+
+def load_results(
+    keys: List[str], read_object: Callable[[str], bytes], concurrency: int
+) -> ResultsTable:
+    """Fetch and decode the results of many runs in parallel into one table.
+
+    The payloads that cannot be read are logged and skipped.
+    """
+
+    def load(key):
+        try:
+            return read_payload(read_object(key))
+        except Exception as e:
+            log.warning(f"Cannot load the results {key}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        payloads = [payload for payload in executor.map(load, keys) if payload]
+    table = ResultsTable()
+    for header, columns in sorted(payloads, key=lambda payload: payload[0]["start"]):
+        table.add(header, columns)
+    return table
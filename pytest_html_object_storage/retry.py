@@ -0,0 +1,186 @@
+import contextvars
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from pytest_html_object_storage.cache import FileCache
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# number of latencies kept per endpoint to compute the hedging percentile
+LATENCY_SAMPLES = 100
+# no hedging before that many latencies are known
+MIN_LATENCY_SAMPLES = 10
+# second unit, shortest timeout given to a request of an upload past its deadline
+MIN_TIMEOUT = 0.1
+
+# monotonic time by which the upload running in this context must be done
+upload_end = contextvars.ContextVar("upload_end", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def percentile(values: list, p: int) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+def remaining(timeout: float) -> float:
+    """Return `timeout`, shortened to the time left to the upload of this context.
+
+    The request timeouts use it: a request abandoned with its upload ends by
+    the deadline instead of holding its connection for the whole timeout.
+    """
+    end = upload_end.get()
+    if end is None:
+        return timeout
+    return max(min(timeout, end - time.monotonic()), MIN_TIMEOUT)
+
+
+def race(call: Callable[[], T], timeout: Optional[float], hedge_after: Optional[float]) -> T:
+    """Run `call` on a worker thread and wait for it at most `timeout` seconds.
+
+    If it is still running after `hedge_after` seconds, the same call is sent
+    a second time and the first success wins. Workers still running when the
+    timeout expires are abandoned: they are daemon threads, and their requests
+    time out by the deadline, see `remaining`.
+    """
+    results = queue.Queue()
+    end = upload_end.get()
+    if timeout is not None:
+        end = min(end or float("inf"), time.monotonic() + timeout)
+
+    def worker():
+        upload_end.set(end)
+        try:
+            results.put((True, call()))
+        except Exception as e:
+            results.put((False, e))
+
+    def launch():
+        threading.Thread(
+            target=worker, name="pytest-html-object-storage-upload", daemon=True
+        ).start()
+
+    start = time.monotonic()
+    launch()
+    launched, failed = 1, 0
+    while True:
+        elapsed = time.monotonic() - start
+        waits = []
+        if timeout is not None:
+            waits.append(timeout - elapsed)
+        hedging = hedge_after is not None and launched == 1
+        if hedging:
+            waits.append(hedge_after - elapsed)
+        try:
+            ok, value = results.get(timeout=max(min(waits), 0) if waits else None)
+        except queue.Empty:
+            if hedging and time.monotonic() - start >= hedge_after:
+                log.info(f"Upload slower than {hedge_after:.2f}s, sending a hedged request")
+                launch()
+                launched += 1
+                continue
+            raise DeadlineExceeded(f"Upload did not finish in {timeout:.0f}s")
+        if ok:
+            return value
+        failed += 1
+        if failed == launched:
+            raise value
+
+
+class UploadPolicy:
+    """Bound uploads in time, retry them and hedge the small ones.
+
+    Each attempt gets a deadline shared by all the attempts of `run`. Failed
+    attempts for which `retryable(error)` is true are retried after a
+    jittered exponential backoff. The calls run with `hedge` (single object
+    PUTs) of up to `hedge_max_size` bytes get a hedged second request when
+    the first one is slower than the `hedge_percentile` of the latencies
+    recorded for the endpoint. Only their latencies are recorded: listings
+    and index updates would skew the percentile.
+    """
+
+    def __init__(
+        self,
+        retryable: Callable[[Exception], bool],
+        endpoint: str,
+        deadline: int,
+        retries: int,
+        backoff: float,
+        hedge_percentile: int = 0,
+        hedge_max_size: int = 0,
+    ):
+        self.retryable = retryable
+        self.endpoint = endpoint
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_size = hedge_max_size
+        self.latencies = FileCache("latencies.json", 7 * 24 * 60 * 60)
+
+    def _hedged(self, size: int, hedge: bool) -> bool:
+        return bool(hedge and self.hedge_percentile and size <= self.hedge_max_size)
+
+    def _hedge_after(self, size: int, hedge: bool) -> Optional[float]:
+        if not self._hedged(size, hedge):
+            return None
+        latencies = self.latencies.get(self.endpoint) or []
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        return percentile(latencies, self.hedge_percentile)
+
+    def _record(self, latency: float):
+        latencies = self.latencies.get(self.endpoint) or []
+        self.latencies.set(self.endpoint, (latencies + [latency])[-LATENCY_SAMPLES:])
+
+    def end(self) -> Optional[float]:
+        """Monotonic time by which an upload starting now must be done."""
+        return time.monotonic() + self.deadline if self.deadline else None
+
+    def run(
+        self,
+        call: Callable[[], T],
+        size: int = 0,
+        hedge: bool = False,
+        end: Optional[float] = None,
+        retryable: Optional[Callable[[Exception], bool]] = None,
+    ) -> T:
+        """Run `call` until `end`, by default the deadline of an upload starting now.
+
+        `retryable` overrides the predicate of the policy for this call.
+        """
+        if end is None:
+            end = self.end()
+        if retryable is None:
+            retryable = self.retryable
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            timeout = end - start if end else None
+            try:
+                result = race(call, timeout, self._hedge_after(size, hedge))
+            except Exception as e:
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if (
+                    isinstance(e, DeadlineExceeded)
+                    or attempt >= self.retries
+                    or not retryable(e)
+                    or (end and time.monotonic() + delay >= end)
+                ):
+                    raise
+                log.warning(f"Upload failed, retry in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if self._hedged(size, hedge):
+                self._record(time.monotonic() - start)
+            return result
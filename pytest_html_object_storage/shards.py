@@ -0,0 +1,190 @@
+import gzip
+import json
+import logging
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+from typing import Callable, List
+
+from _pytest.reports import TestReport
+
+from pytest_html_object_storage.live import get_outcome
+
+log = logging.getLogger(__name__)
+
+# outcomes listed first in the merged report
+PROBLEMS = ("failed", "error", "xpassed")
+
+# The results are embedded as JSON and rendered by the browser: merging is
+# only a concatenation of the shard payloads.
+MERGED_PAGE = Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; font-size: 12px; margin: 2em; }
+th, td { padding: 2px 8px; text-align: left; vertical-align: top; }
+.failed, .error { color: #d00; }
+pre { white-space: pre-wrap; }
+</style>
+</head>
+<body>
+<h1>$title</h1>
+<p id="summary"></p>
+<h2>Shards</h2>
+<table id="shards"><tr><th>Shard</th><th>Duration</th><th>Outcomes</th></tr></table>
+<h2>Tests</h2>
+<label><input type="checkbox" id="all"> Show passed and skipped tests</label>
+<table id="results"><tr><th>Outcome</th><th>Test</th><th>Duration</th><th>Shard</th></tr></table>
+<script id="data" type="application/json">$data</script>
+<script>
+var run = JSON.parse(document.getElementById("data").textContent);
+var problems = ["failed", "error", "xpassed"];
+
+function outcomes(counts) {
+  return Object.keys(counts).sort().map(function (outcome) {
+    return counts[outcome] + " " + outcome;
+  }).join(", ");
+}
+
+document.getElementById("summary").textContent =
+  run.results.length + " tests on " + run.shards.length + " shards: " + outcomes(run.outcomes);
+run.shards.forEach(function (shard) {
+  var row = document.getElementById("shards").insertRow();
+  var link = document.createElement("a");
+  link.href = shard.report;
+  link.textContent = shard.shard;
+  row.insertCell().appendChild(link);
+  row.insertCell().textContent = shard.duration.toFixed(0) + "s";
+  row.insertCell().textContent = outcomes(shard.outcomes);
+});
+
+function render() {
+  var all = document.getElementById("all").checked;
+  var table = document.getElementById("results");
+  while (table.rows.length > 1) {
+    table.deleteRow(1);
+  }
+  run.results.forEach(function (result) {
+    if (!all && problems.indexOf(result.outcome) < 0) {
+      return;
+    }
+    var row = table.insertRow();
+    row.className = result.outcome;
+    row.insertCell().textContent = result.outcome;
+    var test = row.insertCell();
+    if (result.longrepr) {
+      var details = document.createElement("details");
+      var summary = document.createElement("summary");
+      var longrepr = document.createElement("pre");
+      summary.textContent = result.nodeid;
+      longrepr.textContent = result.longrepr;
+      details.appendChild(summary);
+      details.appendChild(longrepr);
+      test.appendChild(details);
+    } else {
+      test.textContent = result.nodeid;
+    }
+    row.insertCell().textContent = result.duration.toFixed(2) + "s";
+    row.insertCell().textContent = result.shard;
+  });
+}
+
+document.getElementById("all").addEventListener("change", render);
+render();
+</script>
+</body>
+</html>
+"""
+)
+
+
+def shards_prefix(run_id: str) -> str:
+    return f"{run_id}/shards/"
+
+
+def shard_key(run_id: str, shard: str) -> str:
+    return f"{shards_prefix(run_id)}{shard}.json.gz"
+
+
+def merged_key(run_id: str) -> str:
+    return f"{run_id}/report.html"
+
+
+def get_result(report: TestReport) -> dict:
+    """Compact result of a test, with the failure details only."""
+    outcome = get_outcome(report)
+    return {
+        "nodeid": report.nodeid,
+        "outcome": outcome,
+        "duration": report.duration,
+        "longrepr": str(report.longrepr) if outcome in ("failed", "error") else None,
+    }
+
+
+def shard_payload(
+    shard: str, report: str, start: float, outcomes: dict, results: List[dict]
+) -> bytes:
+    return gzip.compress(
+        json.dumps(
+            {
+                "shard": shard,
+                "report": report,
+                "duration": time.time() - start,
+                "outcomes": outcomes,
+                "results": results,
+            },
+            separators=(",", ":"),
+        ).encode()
+    )
+
+
+def merge_payloads(run_id: str, payloads: List[dict]) -> dict:
+    shards = []
+    results = []
+    outcomes = {}
+    for payload in sorted(payloads, key=lambda payload: payload["shard"]):
+        shards.append(
+            {
+                "shard": payload["shard"],
+                "report": posixpath.relpath(payload["report"], run_id),
+                "duration": payload["duration"],
+                "outcomes": payload["outcomes"],
+            }
+        )
+        for outcome, count in payload["outcomes"].items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+        results.extend(dict(result, shard=payload["shard"]) for result in payload["results"])
+    results.sort(key=lambda result: result["outcome"] not in PROBLEMS)
+    return {"run_id": run_id, "shards": shards, "outcomes": outcomes, "results": results}
+
+
+def render_merged(merged: dict) -> str:
+    data = json.dumps(merged, separators=(",", ":")).replace("</", "<\\/")
+    return MERGED_PAGE.substitute(title=f"Test run {merged['run_id']}", data=data)
+
+
+def merge_run(
+    run_id: str,
+    list_objects: Callable[[str], List[str]],
+    read_object: Callable[[str], bytes],
+    send_data: Callable[[str, bytes, str], None],
+    concurrency: int,
+) -> int:
+    """Merge the payloads uploaded by the shards of `run_id` into one report.
+
+    The payloads are fetched in parallel, the merged report is uploaded at
+    `merged_key(run_id)`. Return the number of merged shards.
+    """
+    keys = list_objects(shards_prefix(run_id))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        payloads = list(
+            executor.map(lambda key: json.loads(gzip.decompress(read_object(key))), keys)
+        )
+    merged = merge_payloads(run_id, payloads)
+    send_data(merged_key(run_id), render_merged(merged).encode(), "text/html")
+    log.info(f"Merged {len(payloads)} shards of run {run_id}")
+    return len(payloads)
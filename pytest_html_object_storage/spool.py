@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from pytest_html_object_storage.assets import ASSETS_DIR
+from pytest_html_object_storage.background import daemon_map
+from pytest_html_object_storage.cache import get_cache_dir
+
+log = logging.getLogger(__name__)
+
+REPORT = "report.html"
+META = "meta.json"
+STAGING = ".staging-"
+# staging directories older than this were left by an interrupted enqueue
+STAGING_TTL = 3600
+
+
+def get_spool_dir() -> str:
+    return os.environ.get("OBJECT_STORAGE_SPOOL_DIR") or os.path.join(
+        get_cache_dir(), "spool"
+    )
+
+
+class Spool:
+    """Local queue of the reports waiting for their upload.
+
+    There is one queue per storage, `namespace` (backend, endpoint, bucket)
+    is hashed into its directory. An entry is a directory holding the
+    report, its assets and its metadata: it is staged under a hidden name
+    then renamed, so an entry is never seen half written. A flush locks the
+    entries it uploads, so concurrent flushes never send one twice, and
+    removes them only once sent: an interrupted flush is resumed by the
+    next one.
+    """
+
+    def __init__(self, directory: str, namespace: str):
+        digest = hashlib.sha256(namespace.encode()).hexdigest()[:16]
+        self.directory = os.path.join(directory, digest)
+
+    def enqueue(self, report_path: str, meta: dict, assets: bool = False) -> str:
+        """Copy the report (and its assets directory) in the queue, return the entry."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=STAGING, dir=self.directory)
+        try:
+            shutil.copyfile(report_path, os.path.join(staging, REPORT))
+            assets_dir = os.path.join(os.path.dirname(report_path), ASSETS_DIR)
+            if assets and os.path.isdir(assets_dir):
+                shutil.copytree(assets_dir, os.path.join(staging, ASSETS_DIR))
+            with open(os.path.join(staging, META), "w") as f:
+                json.dump(meta, f)
+            # named after the enqueue time, flushed oldest first
+            entry = os.path.join(
+                self.directory, f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+            )
+            os.rename(staging, entry)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return entry
+
+    def entries(self) -> List[str]:
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if name[0] != "."]
+
+    def _clean_staging(self):
+        limit = time.time() - STAGING_TTL
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if name.startswith(STAGING) and os.path.getmtime(path) < limit:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _flush_entry(entry: str, send: Callable[[str, dict], None]) -> Optional[bool]:
+        """Send the entry and remove it, None if flushed by another process."""
+        try:
+            lock = open(os.path.join(entry, META), "rb")
+        except FileNotFoundError:
+            return None
+        with lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            # removed by the flush holding the lock before us
+            if not os.path.exists(os.path.join(entry, META)):
+                return None
+            meta = json.load(lock)
+            try:
+                send(os.path.join(entry, REPORT), meta)
+            except Exception as e:
+                log.error(f"Cannot flush spooled report {meta.get('name')}: {e}")
+                return False
+            # hidden at once, a removal interrupted midway is swept as staging
+            trash = os.path.join(os.path.dirname(entry), STAGING + os.path.basename(entry))
+            try:
+                os.rename(entry, trash)
+            except OSError as e:
+                log.warning(f"Cannot remove spooled report {entry}: {e}")
+                return True
+            shutil.rmtree(trash, ignore_errors=True)
+            return True
+
+    def flush(
+        self, send: Callable[[str, dict], None], concurrency: int
+    ) -> Tuple[int, int]:
+        """Send the queued reports on daemon worker threads, return the number sent and failed.
+
+        `send(report path, metadata)` uploads an entry, the failed entries
+        stay in the queue.
+        """
+        self._clean_staging()
+        entries = self.entries()
+        if not entries:
+            return 0, 0
+        results = daemon_map(lambda e: self._flush_entry(e, send), entries, concurrency)
+        return results.count(True), results.count(False)
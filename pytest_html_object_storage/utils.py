@@ -0,0 +1,16 @@
+import os
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.lower() in ("true", "1", "yes")
+
+
+def env_int(name: str, default: int = 0) -> int:
+    value = os.environ.get(name)
+    if value and int(value) > 0:
+        return int(value)
+    else:
+        return default
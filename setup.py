@@ -28,15 +28,23 @@ setup(
     ),
     data_files=data_files,
     include_package_data=True,
-    python_requires=">=3.7",
+    python_requires=">=3.8",
     install_requires=[
         "pytest-html",
-        "minio",
+        # the conditional index writes use Minio._put_object()
+        "minio>=7.1,<8",
         "python-keystoneclient",
         "python-swiftclient",
     ],
     entry_points={
-        "pytest11": ["html_object_storage = pytest_html_object_storage.plugin"]
+        "console_scripts": [
+            "pytest-html-object-storage = pytest_html_object_storage.__main__:main"
+        ],
+        "pytest11": ["html_object_storage = pytest_html_object_storage.plugin"],
+        "pytest_html_object_storage.backends": [
+            "minio = pytest_html_object_storage.minio:HTMLMinio",
+            "swift = pytest_html_object_storage.swift:HTMLSwift",
+        ],
     },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
@@ -50,7 +58,6 @@ setup(
         "Topic :: Utilities",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
@@ -6,6 +6,11 @@ import pytest
 pytest_plugins = ["pytester"]
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("OBJECT_STORAGE_CACHE_DIR", str(tmp_path / "cache"))
+
+
 @pytest.fixture
 def set_env():
     os.environ["OBJECT_STORAGE_ENDPOINT"] = "enm1n5rid50yi.x.pipedream.net"
@@ -22,8 +27,42 @@ def set_env():
 @pytest.fixture
 def minio():
     with mock.patch("pytest_html_object_storage.minio.Minio") as minio_mock, mock.patch(
-        "pytest_html_object_storage.minio.uuid"
+        "pytest_html_object_storage.backend.uuid"
     ) as uuid_mock:
         client_mock = mock.MagicMock()
         minio_mock.return_value = client_mock
         yield minio_mock, client_mock, uuid_mock
+
+
+@pytest.fixture
+def set_swift_env(set_env):
+    os.environ["OBJECT_STORAGE_TENANT_ID"] = "tenantid"
+    os.environ["OBJECT_STORAGE_TENANT_NAME"] = "tenantname"
+    os.environ["OBJECT_STORAGE_REGION_NAME"] = "GRA"
+    yield
+    del os.environ["OBJECT_STORAGE_TENANT_ID"]
+    del os.environ["OBJECT_STORAGE_TENANT_NAME"]
+    del os.environ["OBJECT_STORAGE_REGION_NAME"]
+
+
+@pytest.fixture
+def swift():
+    with mock.patch(
+        "pytest_html_object_storage.swift.swiftclient.Connection"
+    ) as connection_mock, mock.patch(
+        "pytest_html_object_storage.backend.uuid"
+    ) as uuid_mock:
+        conn_mock = mock.MagicMock()
+
+        def get_auth():
+            conn_mock.url = "https://storage.gra.cloud.ovh.net/v1/AUTH_tenantid"
+            conn_mock.token = "token"
+            return conn_mock.url, conn_mock.token
+
+        def connection(*args, preauthurl=None, preauthtoken=None, **kwargs):
+            conn_mock.url, conn_mock.token = preauthurl, preauthtoken
+            return conn_mock
+
+        conn_mock.get_auth.side_effect = get_auth
+        connection_mock.side_effect = connection
+        yield connection_mock, conn_mock, uuid_mock
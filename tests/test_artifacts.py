@@ -0,0 +1,65 @@
+import threading
+from unittest import mock
+
+from pytest_html_object_storage.artifacts import (
+    collect_artifacts,
+    get_patterns,
+    upload_artifacts,
+)
+
+
+def test_get_patterns():
+    assert get_patterns(None) == []
+    assert get_patterns("junit.xml, htmlcov ,,logs/*.log") == [
+        "junit.xml",
+        "htmlcov",
+        "logs/*.log",
+    ]
+
+
+def test_collect_artifacts(tmp_path):
+    root = tmp_path / "project"
+    (root / "htmlcov" / "sub").mkdir(parents=True)
+    (root / "htmlcov" / "index.html").write_text("index")
+    (root / "htmlcov" / "sub" / "style.css").write_text("css")
+    (root / "logs").mkdir()
+    (root / "logs" / "a.log").write_text("a")
+    (root / "logs" / "b.txt").write_text("b")
+    (root / "junit.xml").write_text("<xml/>")
+    (tmp_path / "outside.png").write_bytes(b"png")
+
+    artifacts = collect_artifacts(
+        ["junit.xml", "htmlcov", "logs/*.log", str(tmp_path / "outside.png"), "none"],
+        str(root),
+    )
+    assert [key for key, _ in artifacts] == [
+        "htmlcov/index.html",
+        "htmlcov/sub/style.css",
+        "junit.xml",
+        "logs/a.log",
+        "outside.png",
+    ]
+    assert dict(artifacts)["logs/a.log"] == str(root / "logs" / "a.log")
+
+
+def test_upload_artifacts(tmp_path):
+    artifacts = []
+    for i in range(20):
+        path = tmp_path / f"{i}.txt"
+        path.write_bytes(b"x" * i)
+        artifacts.append((f"{i}.txt", str(path)))
+    threads = set()
+
+    def put(key, path):
+        threads.add(threading.get_ident())
+        if key == "run/3.txt":
+            raise ConnectionResetError()
+
+    put = mock.MagicMock(side_effect=put)
+    result = upload_artifacts(artifacts, "run", put, 4)
+    assert put.call_count == 20
+    put.assert_any_call("run/19.txt", str(tmp_path / "19.txt"))
+    assert len(threads) <= 4
+    assert (result.files, result.failed, result.size) == (19, 1, sum(range(20)) - 3)
+    assert str(result).startswith("19 artifacts (0.00 MiB) sent in ")
+    assert str(result).endswith(", 1 failed")
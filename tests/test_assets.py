@@ -0,0 +1,25 @@
+import hashlib
+
+from pytest_html_object_storage.assets import collect_assets, upload_missing
+
+
+def test_collect_assets(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "style.css").write_text("body {}")
+    css = hashlib.sha256(b"body {}").hexdigest()
+
+    assert collect_assets(str(tmp_path / "report.html"), "shared") == {
+        "assets/style.css": (f"shared/{css}.css", str(tmp_path / "assets" / "style.css"))
+    }
+
+
+def test_upload_missing_deduplicates():
+    uploaded = []
+    result = upload_missing(
+        [("a", "path_a"), ("a", "path_a"), ("b", "path_b")],
+        lambda key: False,
+        lambda key, path: uploaded.append(key),
+        4,
+    )
+    assert result == (2, 0)
+    assert sorted(uploaded) == ["a", "b"]
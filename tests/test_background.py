@@ -0,0 +1,37 @@
+import threading
+
+import pytest
+
+from pytest_html_object_storage.background import daemon_map
+from pytest_html_object_storage.retry import upload_end
+
+
+def test_daemon_map():
+    assert daemon_map(lambda x: x * 2, range(10), 3) == list(range(0, 20, 2))
+    assert daemon_map(lambda x: x, [], 3) == []
+
+
+def test_daemon_map_error():
+    done = []
+
+    def fn(x):
+        if x in (2, 4):
+            raise ValueError(x)
+        done.append(x)
+
+    with pytest.raises(ValueError, match="2"):
+        daemon_map(fn, range(6), 2)
+    # the other items are not cancelled
+    assert sorted(done) == [0, 1, 3, 5]
+
+
+def test_daemon_map_workers():
+    token = upload_end.set(123.0)
+    try:
+        workers = daemon_map(
+            lambda x: (threading.current_thread().daemon, upload_end.get()), range(2), 2
+        )
+    finally:
+        upload_end.reset(token)
+    # abandoned with their upload, in the context of the caller
+    assert workers == [(True, 123.0), (True, 123.0)]
@@ -0,0 +1,67 @@
+import io
+import threading
+import time
+
+import pytest
+
+from pytest_html_object_storage.bandwidth import (
+    CHUNK_SIZE,
+    MAX_BACKLOG,
+    BandwidthLimiter,
+    ThrottledReader,
+)
+
+
+def test_reserve(tmp_path):
+    limiter = BandwidthLimiter(1000, str(tmp_path / "bandwidth"))
+    assert limiter.reserve(500) <= 0
+    assert limiter.reserve(500) == pytest.approx(0.5, abs=0.05)
+    assert limiter.reserve(100) == pytest.approx(1, abs=0.05)
+
+
+def test_shared_between_processes(tmp_path):
+    # two limiters on the same file behave as two processes of the host
+    first = BandwidthLimiter(1000, str(tmp_path / "bandwidth"))
+    second = BandwidthLimiter(1000, str(tmp_path / "bandwidth"))
+    first.reserve(1000)
+    assert second.reserve(1000) == pytest.approx(1, abs=0.05)
+    assert first.reserve(1000) == pytest.approx(2, abs=0.05)
+
+
+def test_stale_clock(tmp_path):
+    limiter = BandwidthLimiter(1000, str(tmp_path / "bandwidth"))
+    limiter._write(time.time() + MAX_BACKLOG * 2)
+    assert limiter.reserve(1000) <= 0
+
+
+def test_throttled_reader(tmp_path):
+    limiter = BandwidthLimiter(4 * CHUNK_SIZE, str(tmp_path / "bandwidth"))
+    data = b"x" * 3 * CHUNK_SIZE
+    reader = ThrottledReader(io.BytesIO(data), limiter)
+
+    start = time.monotonic()
+    assert reader.read() == data[:CHUNK_SIZE]
+    assert reader.read(10) == b"x" * 10
+    assert reader.tell() == CHUNK_SIZE + 10
+    reader.seek(0)
+    assert b"".join(iter(lambda: reader.read(1024 * 1024), b"")) == data
+    assert time.monotonic() - start >= 0.7
+
+
+def test_fair_shares(tmp_path):
+    limiter = BandwidthLimiter(16 * CHUNK_SIZE, str(tmp_path / "bandwidth"))
+    order = []
+
+    def upload(name):
+        reader = ThrottledReader(io.BytesIO(b"x" * 4 * CHUNK_SIZE), limiter)
+        while reader.read():
+            order.append(name)
+
+    threads = [threading.Thread(target=upload, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # served in turn rather than one upload after the other
+    for end in range(len(order)):
+        assert abs(order[:end].count("a") - order[:end].count("b")) <= 2
@@ -0,0 +1,34 @@
+import os
+import stat
+
+from pytest_html_object_storage.cache import FileCache
+
+
+def test_get_set_delete():
+    cache = FileCache("test.json", 60)
+    assert cache.get("key") is None
+    cache.set("key", {"a": 1})
+    assert cache.get("key") == {"a": 1}
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_expired():
+    cache = FileCache("test.json", 60)
+    cache.set("key", True, ttl=-1)
+    assert cache.get("key") is None
+
+
+def test_shared_between_instances():
+    FileCache("test.json", 60).set("key", "value")
+    assert FileCache("test.json", 60).get("key") == "value"
+
+
+def test_unwritable(tmp_path, monkeypatch):
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("")
+    monkeypatch.setenv("OBJECT_STORAGE_CACHE_DIR", str(not_a_dir))
+    cache = FileCache("test.json", 60)
+    cache.set("key", "value")
+    assert cache.get("key") is None
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from pytest_html_object_storage.clients import ClientPool
+
+
+def test_reuse():
+    factory = mock.MagicMock(side_effect=lambda: object())
+    pool = ClientPool(factory, mock.MagicMock(), 2)
+    with pool.client() as first:
+        pass
+    with pool.client() as second:
+        assert second is first
+    assert factory.call_count == 1
+
+
+def test_concurrent_checkouts_and_close():
+    close = mock.MagicMock()
+    pool = ClientPool(lambda: mock.MagicMock(), close, 2)
+    with pool.client() as a, pool.client() as b, pool.client() as c:
+        assert len({id(a), id(b), id(c)}) == 3
+    # only `maxsize` clients are kept idle, the extra one is closed
+    assert close.call_count == 1
+    pool.close()
+    assert close.call_count == 3
+
+
+def test_threads():
+    factory = mock.MagicMock(side_effect=lambda: object())
+    pool = ClientPool(factory, mock.MagicMock(), 4)
+
+    def use(_):
+        with pool.client() as client:
+            return client
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(use, range(100)))
+    # never more clients than threads using them at the same time
+    assert factory.call_count <= 4
+    pool.close()
@@ -0,0 +1,17 @@
+import gzip
+
+import pytest
+
+from pytest_html_object_storage.compression import check_compression, get_compressor
+
+
+def test_gzip():
+    compressor = get_compressor("gzip")
+    data = compressor.compress(b"<html></html>" * 10000) + compressor.flush()
+    assert len(data) < 1000
+    assert gzip.decompress(data) == b"<html></html>" * 10000
+
+
+def test_unknown_algorithm():
+    with pytest.raises(Exception, match="Unknown compression algorithm: lzma"):
+        check_compression("lzma")
@@ -0,0 +1,55 @@
+import time
+
+from pytest_html_object_storage.endpoints import EndpointRanking, get_endpoints
+
+
+def test_get_endpoints():
+    assert get_endpoints(None) == []
+    assert get_endpoints("s3.example.com") == ["s3.example.com"]
+    assert get_endpoints("eu.example.com, us.example.com,") == [
+        "eu.example.com",
+        "us.example.com",
+    ]
+
+
+def test_rank():
+    delays = {"slow": 0.2, "fast": 0.01, "down": None, "medium": 0.1}
+    probed = []
+
+    def probe(endpoint):
+        probed.append(endpoint)
+        if delays[endpoint] is None:
+            raise ConnectionError("refused")
+        time.sleep(delays[endpoint])
+
+    ranking = EndpointRanking(list(delays), probe, 300)
+    start = time.monotonic()
+    assert ranking.rank() == ["fast", "medium", "slow", "down"]
+    # probed concurrently
+    assert time.monotonic() - start < 0.3
+    # cached for the next runs
+    probed.clear()
+    assert EndpointRanking(list(delays), probe, 300).rank() == [
+        "fast",
+        "medium",
+        "slow",
+        "down",
+    ]
+    assert probed == []
+    ranking.invalidate()
+    assert ranking.rank() == ["fast", "medium", "slow", "down"]
+    assert sorted(probed) == sorted(delays)
+
+
+def test_all_unhealthy():
+    probed = []
+
+    def probe(endpoint):
+        probed.append(endpoint)
+        raise TimeoutError()
+
+    ranking = EndpointRanking(["a", "b"], probe, 300)
+    assert ranking.rank() == ["a", "b"]
+    # not cached: probed again by the next ranking
+    assert ranking.rank() == ["a", "b"]
+    assert len(probed) == 4
@@ -0,0 +1,55 @@
+import datetime
+import threading
+
+from pytest_html_object_storage.gc import collect_garbage, delete_objects, expired_runs
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+OLD = NOW - datetime.timedelta(days=40)
+
+
+def test_expired_runs():
+    objects = [
+        ("old/report.html", OLD),
+        ("old/report.html_segments/00000001", OLD),
+        ("recent/report.html", OLD),
+        ("recent/progress.json", NOW),
+        ("assets/abc.png", OLD),
+        ("index.json", OLD),
+    ]
+    assert expired_runs(objects, 30, {"assets"}) == {
+        "old": ["old/report.html", "old/report.html_segments/00000001"]
+    }
+
+
+def test_expired_runs_keep_indexes():
+    objects = [
+        ("feature-x/old/report.html", OLD),
+        ("feature-x/index.json", OLD),
+        ("feature-x/index.html", OLD),
+        ("project/main/index.json", OLD),
+        ("old/report.html", OLD),
+    ]
+    # the indexes of the other projects, whatever their prefix
+    assert expired_runs(objects, 30, {"assets"}) == {"old": ["old/report.html"]}
+
+
+def test_delete_objects():
+    batches = []
+    threads = set()
+
+    def delete_batch(keys):
+        batches.append(keys)
+        threads.add(threading.get_ident())
+        return len(keys) - (1 if "k2500" in keys else 0)
+
+    keys = [f"k{i}" for i in range(2501)]
+    assert delete_objects(keys, delete_batch, 4) == 2500
+    assert sorted(len(batch) for batch in batches) == [501, 1000, 1000]
+    assert len(threads) <= 4
+
+
+def test_collect_garbage_dry_run():
+    deleted = []
+    objects = [("a/report.html", OLD), ("b/report.html", OLD), ("b/x.png", OLD)]
+    assert collect_garbage(objects, deleted.extend, 30, set(), 2, dry_run=True) == (2, 3)
+    assert deleted == []
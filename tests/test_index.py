@@ -0,0 +1,104 @@
+import json
+from unittest import mock
+
+import pytest
+
+from pytest_html_object_storage.index import (
+    IndexConflict,
+    add_run,
+    index_keys,
+    prune_index,
+    remove_runs,
+    render_index,
+    run_entry,
+    update_index,
+)
+
+
+def entry(name):
+    return run_entry(name, f"https://host/{name}", 0, {"passed": 2, "failed": 1}, 1)
+
+
+def test_run_entry():
+    assert entry("a/report.html")["timestamp"] == "1970-01-01 00:00:00"
+    assert entry("a/report.html")["outcomes"] == {"passed": 2, "failed": 1}
+
+
+def test_add_run():
+    index = add_run(None, entry("a"), 2)
+    index = add_run(index, entry("b"), 2)
+    index = add_run(index, entry("c"), 2)
+    assert [run["name"] for run in index["runs"]] == ["c", "b"]
+    # a retried update does not duplicate the run
+    index = add_run(index, entry("c"), 2)
+    assert [run["name"] for run in index["runs"]] == ["c", "b"]
+
+
+def test_render_index():
+    assert index_keys("project/main") == ("project/main/index.json", "project/main/index.html")
+    page = render_index(add_run(None, entry("uuid/report.html"), 10), "project/main")
+    assert '<a href="../../uuid/report.html">' in page
+    assert "1 failed, 2 passed" in page
+
+
+def test_update_index_conflict():
+    stored = {"data": json.dumps(add_run(None, entry("other"), 10)).encode(), "etag": "1"}
+    writes = []
+
+    def write(data, etag):
+        writes.append(etag)
+        if len(writes) == 1:
+            # another run wins the first race
+            stored["data"] = json.dumps(add_run(None, entry("concurrent"), 10)).encode()
+            stored["etag"] = "2"
+            raise IndexConflict()
+        stored["data"] = data
+
+    with mock.patch("time.sleep"):
+        index = update_index(lambda: (stored["data"], stored["etag"]), write, entry("run"), 10)
+    assert writes == ["1", "2"]
+    assert [run["name"] for run in index["runs"]] == ["run", "concurrent"]
+
+
+def test_update_index_verify():
+    stored = {"data": None}
+    writes = []
+
+    def write(data, etag):
+        writes.append(etag)
+        if len(writes) == 1:
+            # overwritten by another run without conditional update
+            data = json.dumps(add_run(None, entry("concurrent"), 10)).encode()
+        stored["data"] = data
+
+    with mock.patch("time.sleep"):
+        index = update_index(
+            lambda: (stored["data"], "etag" if stored["data"] else None),
+            write,
+            entry("run"),
+            10,
+            verify=True,
+        )
+    assert writes == [None, "etag"]
+    assert [run["name"] for run in index["runs"]] == ["run", "concurrent"]
+
+
+def test_update_index_gives_up():
+    write = mock.MagicMock(side_effect=IndexConflict())
+    with mock.patch("time.sleep"), pytest.raises(IndexConflict):
+        update_index(lambda: (None, None), write, entry("run"), 10)
+
+
+def test_prune_index():
+    index = add_run(add_run(None, entry("old/report.html"), 10), entry("new/report.html"), 10)
+    assert remove_runs(index, {"other"}) is None
+    stored = {"data": json.dumps(index).encode()}
+
+    def write(data, etag):
+        stored["data"] = data
+
+    pruned = prune_index(lambda: (stored["data"], "etag"), write, {"old"}, verify=True)
+    assert [run["name"] for run in pruned["runs"]] == ["new/report.html"]
+    assert json.loads(stored["data"]) == pruned
+    # nothing written when there is no index or none of the runs
+    assert prune_index(lambda: (None, None), write, {"old"}) is None
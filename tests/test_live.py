@@ -0,0 +1,85 @@
+import json
+import threading
+
+from unittest import mock
+
+from pytest_html_object_storage.live import LivePublisher
+
+
+def make_report(nodeid, when="call", outcome="passed"):
+    report = mock.MagicMock(spec=["nodeid", "when", "outcome", "duration"])
+    report.nodeid = nodeid
+    report.when = when
+    report.outcome = outcome
+    report.passed = outcome == "passed"
+    report.failed = outcome == "failed"
+    report.duration = 0.5
+    return report
+
+
+def test_publish_every_n_tests():
+    sent = []
+    published = threading.Event()
+
+    def send_data(name, data, content_type):
+        sent.append((name, data, content_type))
+        if name.endswith("progress.json"):
+            published.set()
+
+    live = LivePublisher(send_data, "anuuid/report.html", 3600, every=2)
+    live.collected = 3
+    live.start()
+    live.add(make_report("test_a.py::test_pass"))
+    live.add(make_report("test_a.py::test_fail", outcome="failed"))
+    live.add(make_report("test_a.py::test_setup", when="setup"))
+    assert published.wait(5)
+    live.stop()
+    live.finish()
+
+    # never at the report key, a late page upload cannot replace the report
+    assert sent[0][0] == "anuuid/live.html"
+    assert sent[0][2] == "text/html"
+    assert b"progress.json" in sent[0][1]
+    assert b'location.replace("report.html")' in sent[0][1]
+    progress = json.loads(sent[1][1])
+    assert sent[1][0] == "anuuid/progress.json"
+    assert progress["state"] == "running"
+    assert progress["collected"] == 3
+    assert progress["outcomes"] == {"passed": 1, "failed": 1}
+    assert progress["failures"] == [
+        {"nodeid": "test_a.py::test_fail", "outcome": "failed", "duration": 0.5}
+    ]
+    assert json.loads(sent[-1][1])["state"] == "finished"
+
+
+def test_publish_error_is_not_raised():
+    live = LivePublisher(mock.MagicMock(side_effect=Exception("down")), "a/report.html", 1)
+    live.start()
+    live.stop()
+    live.finish()
+
+
+def test_stalled_publish():
+    release = threading.Event()
+    sent = []
+
+    def send_data(name, data, content_type):
+        sent.append(name)
+        release.wait(5)
+
+    live = LivePublisher(send_data, "a/report.html", 3600)
+    live.start()
+    live.stop(timeout=0.1)
+    # not waiting for the stalled page upload
+    assert sent == ["a/live.html"]
+    release.set()
+
+
+def test_publish_failed():
+    sent = []
+    live = LivePublisher(
+        lambda name, data, content_type: sent.append((name, data)), "a/report.html", 1
+    )
+    live.fail()
+    assert sent[-1][0] == "a/progress.json"
+    assert json.loads(sent[-1][1])["state"] == "failed"
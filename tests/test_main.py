@@ -0,0 +1,87 @@
+import datetime
+import json
+from unittest import mock
+
+import pytest
+from minio.error import S3Error
+
+from pytest_html_object_storage.__main__ import get_backend, main
+from pytest_html_object_storage.index import run_entry
+from pytest_html_object_storage.shards import shard_payload
+
+
+def test_merge(set_env, minio, capsys):
+    minio_mock, client_mock, uuid_mock = minio
+    payload = shard_payload("node1", "run/node1/report.html", 0, {"passed": 1}, [])
+    client_mock.list_objects.return_value = [
+        mock.MagicMock(object_name="run/shards/node1.json.gz")
+    ]
+    client_mock.get_object.return_value.read.return_value = payload
+
+    main(["--backend", "minio", "merge", "run"])
+    args, kwargs = client_mock.put_object.call_args
+    assert args[:2] == ("test", "run/report.html")
+    assert capsys.readouterr().out == (
+        "https://enm1n5rid50yi.x.pipedream.net/test/run/report.html\n"
+    )
+
+
+def test_missing_env(monkeypatch):
+    monkeypatch.delenv("OBJECT_STORAGE_ENDPOINT", raising=False)
+    with pytest.raises(SystemExit, match="OBJECT_STORAGE_ENDPOINT"):
+        main(["merge", "run"])
+
+
+def test_gc(set_env, minio, capsys):
+    minio_mock, client_mock, uuid_mock = minio
+    old = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    client_mock.list_objects.return_value = [
+        mock.MagicMock(object_name="old/report.html", last_modified=old),
+        mock.MagicMock(object_name="assets/abc.png", last_modified=old),
+        mock.MagicMock(
+            object_name="new/report.html",
+            last_modified=datetime.datetime.now(datetime.timezone.utc),
+        ),
+    ]
+    client_mock.remove_objects.return_value = iter([])
+    new, old_run = (
+        run_entry(name, f"https://host/{name}", 0, {"passed": 1}, 0)
+        for name in ("new/report.html", "old/report.html")
+    )
+    index = {"runs": [new, old_run]}
+    client_mock.get_object.return_value.read.return_value = json.dumps(index).encode()
+
+    main(["gc", "--days", "30"])
+    (bucket, objects), _ = client_mock.remove_objects.call_args
+    assert [obj.name for obj in objects] == ["old/report.html"]
+    assert capsys.readouterr().out == "Deleted 1 objects of 1 runs older than 30 days\n"
+    # the deleted run is removed from the run index
+    (bucket, key, data, headers), _ = client_mock._put_object.call_args
+    assert key == "index.json"
+    assert json.loads(data) == {"runs": [new]}
+    args, kwargs = client_mock.put_object.call_args
+    assert args[:2] == ("test", "index.html")
+
+
+@pytest.mark.parametrize("days", ["0", "-1", "x"])
+def test_gc_days(set_env, minio, capsys, days):
+    with pytest.raises(SystemExit):
+        main(["gc", "--days", days])
+    assert "argument --days" in capsys.readouterr().err
+
+
+def test_flush(set_env, minio, capsys, tmp_path):
+    minio_mock, client_mock, uuid_mock = minio
+    report = tmp_path / "report.html"
+    report.write_text("<html></html>")
+    backend = get_backend("minio")
+    backend.spool.enqueue(
+        str(report), {"name": "anuuid/report.html", "self_contained": True, "index": None}
+    )
+    client_mock.fput_object.side_effect = [S3Error(*[mock.MagicMock()] * 6), None]
+
+    with pytest.raises(SystemExit):
+        main(["flush"])
+    assert capsys.readouterr().out == "Sent 0 spooled reports, 1 failed\n"
+    main(["flush"])
+    assert capsys.readouterr().out == "Sent 1 spooled reports, 0 failed\n"
@@ -0,0 +1,61 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from pytest_html_object_storage.metrics import Timings, publish_timings
+
+
+def test_summary():
+    timings = Timings("minio")
+    with mock.patch("time.perf_counter", side_effect=[0, 1, 1, 3, 3, 4]):
+        with timings.span("client"):
+            pass
+        with timings.span("put", 4 * 1024 ** 2):
+            pass
+        with timings.span("put", 2 * 1024 ** 2):
+            pass
+    summary = timings.summary()
+    assert list(summary) == ["client", "put"]
+    assert summary["put"] == {
+        "count": 2,
+        "seconds": 3.0,
+        "bytes": 6 * 1024 ** 2,
+        "throughput": 2 * 1024 ** 2,
+    }
+    assert timings.lines() == [
+        "client: 1.000s",
+        "put: 3.000s (2 calls), 6.00 MiB at 2.00 MiB/s",
+    ]
+
+
+def test_span_on_error():
+    timings = Timings("swift")
+    try:
+        with timings.span("auth"):
+            raise ConnectionError()
+    except ConnectionError:
+        pass
+    assert timings.summary()["auth"]["count"] == 1
+
+
+def test_write(tmp_path):
+    timings = Timings("swift")
+    with timings.span("put", 10):
+        pass
+    timings.write(str(tmp_path / "metrics.json"))
+    content = json.loads((tmp_path / "metrics.json").read_text())
+    assert content["backend"] == "swift"
+    assert content["phases"]["put"]["bytes"] == 10
+
+    timings.write(str(tmp_path / "metrics.prom"))
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert "# TYPE pytest_html_object_storage_phase_seconds gauge" in lines
+    assert 'pytest_html_object_storage_phase_bytes{backend="swift",phase="put"} 10' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_publish_without_hook(tmp_path):
+    # a config built outside of a pytest session, e.g. by the benchmarks
+    config = SimpleNamespace()
+    publish_timings(config, Timings("minio"), str(tmp_path / "timings.json"))
+    assert json.loads((tmp_path / "timings.json").read_text())["backend"] == "minio"
@@ -0,0 +1,21 @@
+from pytest_html_object_storage.multipart import split, upload_parts
+
+
+def test_split():
+    assert split(10, 4) == [(1, 0, 4), (2, 4, 4), (3, 8, 2)]
+    assert split(8, 4) == [(1, 0, 4), (2, 4, 4)]
+    assert split(0, 4) == []
+
+
+def test_upload_parts(tmp_path):
+    report = tmp_path / "report.html"
+    report.write_bytes(b"0123456789")
+    received = {}
+
+    def upload_part(index, segment):
+        received[index] = segment.read(3) + segment.read()
+        return f"etag{index}"
+
+    parts = upload_parts(str(report), 4, 2, upload_part)
+    assert parts == [(1, 4, "etag1"), (2, 4, "etag2"), (3, 2, "etag3")]
+    assert received == {1: b"0123", 2: b"4567", 3: b"89"}
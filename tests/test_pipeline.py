@@ -0,0 +1,140 @@
+import base64
+import gzip
+import hashlib
+import io
+import os
+from pathlib import Path
+from unittest import mock
+
+from pytest_html_object_storage.metrics import Timings
+from pytest_html_object_storage.multipart import MiB
+from pytest_html_object_storage.pipeline import ReportPipeline, rewrite
+
+
+def pipeline(exists=lambda key: False, put=None, **kwargs):
+    return ReportPipeline(
+        "anuuid/report.html",
+        exists,
+        put or mock.MagicMock(),
+        Timings("test"),
+        2,
+        "assets",
+        **kwargs,
+    )
+
+
+def test_nothing_to_do(tmp_path):
+    report = tmp_path / "report.html"
+    report.write_bytes(b"<html></html>")
+
+    with pipeline(compression="gzip", compression_threshold=1024).prepare(
+        str(report)
+    ) as (path, encoding):
+        # below the compression threshold, uploaded as is
+        assert path == str(report)
+        assert encoding is None
+
+
+def test_shared_assets(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "style.css").write_text("body {}")
+    (tmp_path / "assets" / "test_1_0.png").write_bytes(b"png")
+    report = tmp_path / "report.html"
+    report.write_text(
+        '<link href="assets/style.css"/><img src="assets/test_1_0.png"/>'
+    )
+    css = hashlib.sha256(b"body {}").hexdigest()
+    png = hashlib.sha256(b"png").hexdigest()
+    uploaded = {}
+
+    with pipeline(
+        lambda key: key == f"assets/{css}.css",
+        lambda key, path: uploaded.update({key: path}),
+        shared_assets=True,
+    ).prepare(str(report)) as (path, encoding):
+        assert encoding is None
+        with open(path) as f:
+            assert f.read() == (
+                f'<link href="../assets/{css}.css"/><img src="../assets/{png}.png"/>'
+            )
+    assert not os.path.exists(path)
+    assert uploaded == {f"assets/{png}.png": str(tmp_path / "assets" / "test_1_0.png")}
+
+
+def test_data_uris(tmp_path):
+    # larger than the read chunks, so decoded across reads
+    screenshot = os.urandom(3 * MiB + 1)
+    small = base64.b64encode(b"small").decode()
+    large = base64.b64encode(screenshot).decode()
+    report = tmp_path / "report.html"
+    report.write_text(
+        f'<div data-jsonblob="{{&#34;a&#34;: &#34;data:image/png;base64,{large}&#34;, '
+        f'&#34;b&#34;: &#34;data:text/plain;charset=utf-8;base64,{small}&#34;, '
+        f'&#34;c&#34;: &#34;data:image/png;base64,{large}&#34;}}">data: not a uri</div>'
+    )
+    digest = hashlib.sha256(screenshot).hexdigest()
+    uploaded = {}
+
+    with pipeline(
+        put=lambda key, path: uploaded.update({key: Path(path).read_bytes()}),
+        data_uri_threshold=1024,
+    ).prepare(str(report)) as (path, encoding):
+        with open(path) as f:
+            assert f.read() == (
+                f'<div data-jsonblob="{{&#34;a&#34;: &#34;../assets/{digest}.png&#34;, '
+                f'&#34;b&#34;: &#34;data:text/plain;charset=utf-8;base64,{small}&#34;, '
+                f'&#34;c&#34;: &#34;../assets/{digest}.png&#34;}}">data: not a uri</div>'
+            )
+    # identical screenshots are stored once
+    assert uploaded == {f"assets/{digest}.png": screenshot}
+
+
+def test_single_pass(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "style.css").write_text("body {}")
+    image = base64.b64encode(b"x" * 2048).decode()
+    report = tmp_path / "report.html"
+    report.write_text(
+        f'<link href="assets/style.css"/><img src="data:image/png;base64,{image}"/>'
+        * 1000
+    )
+    put = mock.MagicMock()
+
+    with mock.patch("builtins.open", wraps=open) as open_mock, pipeline(
+        put=put,
+        shared_assets=True,
+        data_uri_threshold=1024,
+        compression="gzip",
+    ).prepare(str(report)) as (path, encoding):
+        assert encoding == "gzip"
+        with gzip.open(path) as f:
+            html = f.read().decode()
+    # the report is read once, rewritten and compressed on the way
+    assert [c.args[0] for c in open_mock.call_args_list].count(str(report)) == 1
+    assert html.count('<link href="../assets/') == 1000
+    assert html.count('<img src="../assets/') == 1000
+    assert put.call_count == 2
+
+
+def test_rewrite_across_chunks():
+    # the markers straddle the chunk boundaries
+    for offset in range(-8, 8):
+        data = b"x" * (MiB + offset) + b"assets/a.png" + b"y" * (MiB - 3) + b"assets/a.png"
+        out = io.BytesIO()
+        rewrite(io.BytesIO(data), out.write, {"assets/a.png": "../a"}, 0, "", "assets")
+        assert out.getvalue() == data.replace(b"assets/a.png", b"../a")
+
+
+def test_invalid_data_uri():
+    for size in (1000, MiB):
+        # unpadded: the decoding fails on the last bytes
+        data = b"data:image/png;base64," + b"QUJD" * size + b"QQ"
+        out = io.BytesIO()
+        html = b"<img src=" + data + b">"
+        assert rewrite(io.BytesIO(html), out.write, {}, 1024, "", "assets") == {}
+        assert out.getvalue() == html
+    # invalid in the middle of a large data URI, decoded across reads
+    data = b"data:image/png;base64," + b"QUJD" * MiB + b"Q=QQ" + b"QUJD" * MiB
+    out = io.BytesIO()
+    assert rewrite(io.BytesIO(data), out.write, {}, 1024, "", "assets") == {}
+    assert out.getvalue() == data
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+from unittest import mock
+
+from pytest_html_object_storage.plugin import get_backends
+
+
+def test_backends():
+    backends = get_backends()
+    assert {"minio", "swift"} <= set(backends)
+    assert backends["minio"].value == "pytest_html_object_storage.minio:HTMLMinio"
+
+
+def test_backends_scanned_once():
+    get_backends.cache_clear()
+    with mock.patch(
+        "pytest_html_object_storage.plugin.entry_points", return_value={}
+    ) as entry_points:
+        assert get_backends() is get_backends()
+    entry_points.assert_called_once_with()
+    get_backends.cache_clear()
+
+
+def test_lazy_backend_import(tmp_path):
+    # the plugin is loaded by every pytest run: the clients are imported only
+    # when a backend is selected
+    code = (
+        "import sys, pytest\n"
+        f"pytest.main(['-q', '-p', 'no:cacheprovider', {str(tmp_path)!r}])\n"
+        "assert 'pytest_html_object_storage.plugin' in sys.modules\n"
+        "print(sorted(m for m in sys.modules if m.split('.')[0] in "
+        "('minio', 'swiftclient', 'keystoneclient', 'urllib3')))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.splitlines()[-1] == "[]"
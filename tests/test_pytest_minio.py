@@ -1,8 +1,25 @@
 from _pytest.config import ExitCode
 from _pytest.pytester import RunResult
+from minio import Minio
+from minio.error import S3Error, ServerError
+import urllib3
 
 import pytest
 
+from pytest_html_object_storage.bandwidth import ThrottledReader
+from pytest_html_object_storage.cache import FileCache
+from pytest_html_object_storage.minio import HTMLMinio
+from pytest_html_object_storage.results import read_payload
+from pytest_html_object_storage.retry import DeadlineExceeded
+
+import inspect
+import json
+import os
+import re
+import signal
+import socket
+import threading
+import time
 from unittest import mock
 
 
@@ -48,6 +65,7 @@ class TestMinio:
                     "password",
                     region=None,
                     secure=True,
+                    http_client=mock.ANY,
                 ),
                 mock.call().bucket_exists("test"),
                 mock.call().fput_object(
@@ -55,6 +73,9 @@ class TestMinio:
                     "anuuid/report.html",
                     "test_report.html",
                     content_type="text/html",
+                    metadata=None,
+                    part_size=16 * 1024 * 1024,
+                    num_parallel_uploads=4,
                 ),
             ]
         )
@@ -87,6 +108,7 @@ class TestMinio:
                     "password",
                     region=None,
                     secure=True,
+                    http_client=mock.ANY,
                 ),
                 mock.call().bucket_exists("test"),
                 mock.call().make_bucket("test"),
@@ -99,6 +121,9 @@ class TestMinio:
                     "anuuid/report.html",
                     "test_report.html",
                     content_type="text/html",
+                    metadata=None,
+                    part_size=16 * 1024 * 1024,
+                    num_parallel_uploads=4,
                 ),
             ]
         )
@@ -112,3 +137,625 @@ class TestMinio:
         pytester.makepyfile("def test_no_config(): pass")
         result: RunResult = run(pytester)
         assert result.ret == ExitCode.INTERNAL_ERROR
+
+    def test_background_upload(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_BACKGROUND", "true")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        client_mock.fput_object.assert_called_once_with(
+            "test",
+            "anuuid/report.html",
+            "test_report.html",
+            content_type="text/html",
+            metadata=None,
+            part_size=16 * 1024 * 1024,
+            num_parallel_uploads=4,
+        )
+        result.stdout.re_match_lines(
+            [
+                ".*HTML report sent on MinIO object storage at https://enm1n5rid50yi.x.pipedream.net/test/anuuid/report.html.*"
+            ]
+        )
+
+    def test_background_pending(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_BACKGROUND", "true")
+        monkeypatch.setenv("OBJECT_STORAGE_BACKGROUND_TIMEOUT", "1")
+
+        released = threading.Event()
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.fput_object.side_effect = lambda *args, **kwargs: released.wait(5)
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        released.set()
+        assert result.ret == 0
+        result.stdout.re_match_lines(
+            [".*HTML report upload on MinIO object storage still pending after 1s.*"]
+        )
+
+    def test_background_hanging_endpoint(self, pytester, set_env, monkeypatch):
+        # accepts the connections and never answers
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        endpoint = f"127.0.0.1:{server.getsockname()[1]}"
+        monkeypatch.setenv("OBJECT_STORAGE_ENDPOINT", endpoint)
+        monkeypatch.setenv("OBJECT_STORAGE_SECURE", "false")
+        monkeypatch.setenv("OBJECT_STORAGE_BACKGROUND", "true")
+        monkeypatch.setenv("OBJECT_STORAGE_BACKGROUND_TIMEOUT", "1")
+        # the assets are checked and sent on a pool of workers
+        monkeypatch.setenv("OBJECT_STORAGE_SHARED_ASSETS", "true")
+        FileCache("buckets.json", 3600).set(f"{endpoint}/test", True)
+        pytester.makepyfile("def test_pass(): pass")
+        start = time.monotonic()
+        try:
+            result: RunResult = pytester.runpytest_subprocess(
+                "--store-minio", "--html=test_report.html", timeout=30
+            )
+        finally:
+            server.close()
+        assert result.ret == ExitCode.OK
+        assert time.monotonic() - start < 20
+        result.stdout.re_match_lines(
+            [".*HTML report upload on MinIO object storage still pending after 1s.*"]
+        )
+
+    def test_send_error(self, pytester, set_env, minio):
+        minio_mock, client_mock, uuid_mock = minio
+
+        client_mock.bucket_exists.side_effect = Exception("unreachable")
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        result.stdout.re_match_lines(
+            [".*HTML report upload on MinIO object storage failed.*"]
+        )
+
+    def test_compressed_report(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_COMPRESSION", "gzip")
+        monkeypatch.setenv("OBJECT_STORAGE_COMPRESSION_THRESHOLD", "1")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        args, kwargs = client_mock.fput_object.call_args
+        assert args[:2] == ("test", "anuuid/report.html")
+        assert args[2].endswith(".gzip")
+        assert kwargs["content_type"] == "text/html"
+        assert kwargs["metadata"] == {"Content-Encoding": "gzip"}
+
+    def test_bandwidth_limit(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_BANDWIDTH", str(10 * 1024 * 1024))
+        sent = {}
+
+        def put_object(bucket, name, data, length, **kwargs):
+            sent[name] = b"".join(iter(lambda: data.read(length), b""))
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.put_object.side_effect = put_object
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        client_mock.fput_object.assert_not_called()
+        args, kwargs = client_mock.put_object.call_args
+        assert isinstance(args[2], ThrottledReader)
+        assert kwargs["content_type"] == "text/html"
+        assert sent["anuuid/report.html"] == (
+            pytester.path / "test_report.html"
+        ).read_bytes()
+
+    def test_endpoint_failover(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_ENDPOINT", "eu.example.com,us.example.com")
+        monkeypatch.setenv("OBJECT_STORAGE_RETRIES", "0")
+        clients = {
+            "eu.example.com": mock.MagicMock(),
+            "us.example.com": mock.MagicMock(),
+        }
+        clients["eu.example.com"].fput_object.side_effect = ServerError("down", 503)
+        minio_mock.side_effect = lambda endpoint, *args, **kwargs: clients[endpoint]
+        probed = []
+
+        def probe(self, endpoint):
+            probed.append(endpoint)
+            # eu answers faster
+            time.sleep(0.01 if endpoint == "eu.example.com" else 0.05)
+
+        monkeypatch.setattr(HTMLMinio, "_probe", probe)
+        uuid_mock.uuid4.return_value = "anuuid"
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        assert sorted(probed) == ["eu.example.com", "us.example.com"]
+        clients["eu.example.com"].fput_object.assert_called_once()
+        args, kwargs = clients["us.example.com"].fput_object.call_args
+        assert args[:2] == ("test", "anuuid/report.html")
+        result.stdout.re_match_lines(
+            [".*HTML report sent on MinIO object storage at https://us.example.com/test/anuuid/report.html.*"]
+        )
+
+    def test_bucket_cache(self, pytester, set_env, minio):
+        minio_mock, client_mock, uuid_mock = minio
+
+        client_mock.bucket_exists.return_value = True
+        pytester.makepyfile("def test_pass(): pass")
+        for _ in range(2):
+            result: RunResult = run(
+                pytester, "--html=test_report.html", "--self-contained-html"
+            )
+            assert result.ret == 0
+        client_mock.bucket_exists.assert_called_once_with("test")
+        assert client_mock.fput_object.call_count == 2
+
+    def test_bucket_cache_stale(self, pytester, set_env, minio):
+        minio_mock, client_mock, uuid_mock = minio
+
+        client_mock.bucket_exists.return_value = True
+        pytester.makepyfile("def test_pass(): pass")
+        run(pytester, "--html=test_report.html", "--self-contained-html")
+
+        client_mock.bucket_exists.return_value = False
+        client_mock.fput_object.side_effect = [
+            S3Error(mock.MagicMock(), "NoSuchBucket", "", "", "", ""),
+            None,
+        ]
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        client_mock.make_bucket.assert_called_once_with("test")
+        assert client_mock.fput_object.call_count == 3
+
+    def test_shared_assets(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_SHARED_ASSETS", "true")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.stat_object.side_effect = S3Error(
+            mock.MagicMock(), "NoSuchKey", "", "", "", ""
+        )
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(pytester, "--html=test_report.html")
+        assert result.ret == 0
+        keys = [c.args[1] for c in client_mock.fput_object.call_args_list]
+        assert len(keys) == 2
+        assert keys[0].startswith("assets/") and keys[0].endswith(".css")
+        assert keys[1] == "anuuid/report.html"
+
+    def test_live_report(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_LIVE", "true")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        result.stdout.re_match_lines(
+            [
+                "Live HTML report on MinIO object storage at https://enm1n5rid50yi.x.pipedream.net/test/anuuid/live.html",
+            ]
+        )
+        names = [c.args[1] for c in client_mock.put_object.call_args_list]
+        assert names == ["anuuid/live.html", "anuuid/progress.json"]
+        assert client_mock.fput_object.call_args.args[1] == "anuuid/report.html"
+        # one client, and its HTTP pool, for all the uploads of the session
+        minio_mock.assert_called_once()
+
+    def test_live_report_upload_failed(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_LIVE", "true")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.fput_object.side_effect = S3Error(*[mock.MagicMock()] * 6)
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        args, kwargs = client_mock.put_object.call_args
+        assert args[1] == "anuuid/progress.json"
+        assert json.loads(args[2].read())["state"] == "failed"
+
+    def test_retry_upload(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_BACKOFF", "0.01")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.fput_object.side_effect = [ConnectionResetError(), None]
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        assert client_mock.fput_object.call_count == 2
+        result.stdout.re_match_lines(
+            [".*HTML report sent on MinIO object storage at .*anuuid/report.html.*"]
+        )
+
+    def test_upload_timings(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_METRICS_FILE", "metrics.prom")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = False
+        pytester.makeconftest(
+            """
+            def pytest_html_object_storage_timings(config, backend, timings):
+                print("timings hook", backend, sorted(timings.summary()))
+            """
+        )
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "-v", "-s", "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        result.stdout.re_match_lines(
+            [
+                r".*timings hook minio \['bucket_check', 'bucket_setup', 'client', 'put'\]",
+                r"  client: .*s",
+                r"  bucket_check: .*s",
+                r"  put: .*s, .* MiB at .* MiB/s",
+            ]
+        )
+        metrics = (pytester.path / "metrics.prom").read_text()
+        assert (
+            'pytest_html_object_storage_phase_calls{backend="minio",phase="put"} 1'
+            in metrics
+        )
+
+    def test_artifacts_upload(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_ARTIFACTS", "junit.xml,htmlcov")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        pytester.makepyfile("def test_pass(): pass")
+        pytester.mkdir("htmlcov")
+        (pytester.path / "htmlcov" / "index.html").write_text("coverage")
+        result: RunResult = run(
+            pytester,
+            "--junitxml=junit.xml",
+            "--html=test_report.html",
+            "--self-contained-html",
+        )
+        assert result.ret == 0
+        client_mock.fput_object.assert_has_calls(
+            [
+                mock.call(
+                    "test",
+                    "anuuid/htmlcov/index.html",
+                    mock.ANY,
+                    content_type="text/html",
+                    part_size=16 * 1024 * 1024,
+                ),
+                mock.call(
+                    "test",
+                    "anuuid/junit.xml",
+                    mock.ANY,
+                    content_type="application/xml",
+                    part_size=16 * 1024 * 1024,
+                ),
+            ],
+            any_order=True,
+        )
+        result.stdout.re_match_lines([".*2 artifacts .* sent in .* MiB/s.*"])
+
+    def test_run_index(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_INDEX", "true")
+        monkeypatch.setenv("OBJECT_STORAGE_INDEX_PREFIX", "project/main")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.get_object.side_effect = S3Error(
+            mock.MagicMock(), "NoSuchKey", "", "", "", ""
+        )
+        pytester.makepyfile(
+            """
+            def test_pass(): pass
+            def test_fail(): assert False
+            """
+        )
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 1
+        client_mock.get_object.assert_called_once_with(
+            "test", "project/main/index.json"
+        )
+        (bucket, key, data, headers), _ = client_mock._put_object.call_args
+        assert key == "project/main/index.json"
+        assert headers == {"Content-Type": "application/json", "If-None-Match": "*"}
+        (run_,) = json.loads(data)["runs"]
+        assert run_["name"] == "anuuid/report.html"
+        assert run_["outcomes"] == {"passed": 1, "failed": 1}
+        assert run_["exitstatus"] == 1
+        args, kwargs = client_mock.put_object.call_args
+        assert args[:2] == ("test", "project/main/index.html")
+        assert kwargs["content_type"] == "text/html"
+
+    def test_spooled_report(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_SPOOL", "true")
+        monkeypatch.setenv("OBJECT_STORAGE_INDEX", "true")
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == ExitCode.OK
+        # enqueued without connecting to the storage
+        minio_mock.assert_not_called()
+        result.stdout.re_match_lines(
+            [".*HTML report spooled in .*, sent by the next run.*"]
+        )
+
+        client_mock.bucket_exists.return_value = True
+        client_mock.get_object.side_effect = S3Error(
+            mock.MagicMock(), "NoSuchKey", "", "", "", ""
+        )
+        backend = HTMLMinio(None)
+        assert backend.flush() == (1, 0)
+        assert client_mock.fput_object.call_args[0][:2] == (
+            "test",
+            "anuuid/report.html",
+        )
+        (bucket, key, data, headers), _ = client_mock._put_object.call_args
+        (run_,) = json.loads(data)["runs"]
+        assert run_["url"] == (
+            "https://enm1n5rid50yi.x.pipedream.net/test/anuuid/report.html"
+        )
+        assert backend.spool.entries() == []
+
+    def test_results_sidecar(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_RESULTS", "true")
+        stored = {}
+
+        def put_object(bucket, name, data, length, content_type):
+            stored[name] = data.read()
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        client_mock.bucket_exists.return_value = True
+        client_mock.put_object.side_effect = put_object
+        pytester.makepyfile(
+            """
+            def test_pass(): pass
+            def test_fail(): assert False
+            """
+        )
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 1
+        header, columns = read_payload(stored["anuuid/results.bin.gz"])
+        assert header["nodeids"] == [
+            "test_results_sidecar.py::test_pass",
+            "test_results_sidecar.py::test_fail",
+        ]
+        assert header["phases"] == ["setup", "call", "teardown"]
+        assert len(columns["duration"]) == 6
+
+        client_mock.list_objects.return_value = [
+            mock.MagicMock(object_name="anuuid/report.html"),
+            mock.MagicMock(object_name="anuuid/results.bin.gz"),
+        ]
+        client_mock.get_object.return_value.read.return_value = stored[
+            "anuuid/results.bin.gz"
+        ]
+        table = HTMLMinio(None).load_results()
+        client_mock.get_object.assert_called_once_with("test", "anuuid/results.bin.gz")
+        assert [
+            table.columns["test"][row] for row in table.rows(outcome="failed")
+        ] == [1]
+
+    def test_sharded_run(self, pytester, set_env, minio, monkeypatch):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_RUN_ID", "run")
+        monkeypatch.setenv("OBJECT_STORAGE_SHARD", "node1")
+        monkeypatch.setenv("OBJECT_STORAGE_SHARDS", "1")
+        stored = {}
+
+        def put_object(bucket, name, data, length, content_type):
+            stored[name] = data.read()
+
+        def get_object(bucket, name):
+            return mock.MagicMock(**{"read.return_value": stored[name]})
+
+        client_mock.bucket_exists.return_value = True
+        client_mock.put_object.side_effect = put_object
+        client_mock.get_object.side_effect = get_object
+        client_mock.list_objects.side_effect = lambda bucket, prefix, recursive: [
+            mock.MagicMock(object_name=name) for name in stored if name.startswith(prefix)
+        ]
+        pytester.makepyfile(
+            """
+            def test_pass(): pass
+            def test_fail(): assert False
+            """
+        )
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 1
+        assert client_mock.fput_object.call_args[0][:2] == ("test", "run/node1/report.html")
+        assert set(stored) == {"run/shards/node1.json.gz", "run/report.html"}
+        assert b"test_sharded_run.py::test_fail" in stored["run/report.html"]
+        result.stdout.re_match_lines(
+            [
+                ".*HTML report sent on MinIO object storage at .*/test/run/node1/report.html.*",
+                ".*Merged HTML report of run run at .*/test/run/report.html.*",
+            ]
+        )
+
+    def test_retryable_errors(self):
+        assert HTMLMinio._is_retryable(ConnectionResetError())
+        assert HTMLMinio._is_retryable(ServerError("HTTP 503", 503))
+        # neither retried nor failed over
+        assert not HTMLMinio._is_retryable(FileNotFoundError("report.html"))
+        assert not HTMLMinio._is_retryable(PermissionError("report.html"))
+
+    def test_put_object_signature(self):
+        # private API of minio, pinned in setup.py: used for the conditional index writes
+        parameters = list(inspect.signature(Minio._put_object).parameters)
+        assert parameters[:5] == ["self", "bucket_name", "object_name", "data", "headers"]
+
+    def test_flush_previous_reports(self, pytester, set_env, minio, monkeypatch, tmp_path):
+        minio_mock, client_mock, uuid_mock = minio
+        monkeypatch.setenv("OBJECT_STORAGE_SPOOL", "true")
+        report = tmp_path / "previous.html"
+        report.write_text("<html></html>")
+        HTMLMinio(None).spool.enqueue(
+            str(report), {"name": "previous/report.html", "self_contained": True, "index": None}
+        )
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        pytester.makepyfile("def test_pass(): pass")
+        with mock.patch("pytest_html_object_storage.backend.subprocess.Popen") as popen:
+            popen.return_value.pid = 1234
+            result: RunResult = run(
+                pytester, "--html=test_report.html", "--self-contained-html"
+            )
+        assert result.ret == ExitCode.OK
+        # sent by the flush command of a detached process, never waited for
+        (command,), kwargs = popen.call_args
+        assert command[1:] == ["-m", "pytest_html_object_storage", "--backend", "minio", "flush"]
+        assert kwargs["start_new_session"]
+        minio_mock.assert_not_called()
+        result.stdout.re_match_lines(
+            [".*Spooled HTML reports of the previous runs sent .* by process 1234.*"]
+        )
+
+    def test_flush_hanging_endpoint(self, pytester, set_env, monkeypatch, tmp_path):
+        # accepts the connections and never answers
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        monkeypatch.setenv("OBJECT_STORAGE_ENDPOINT", f"127.0.0.1:{server.getsockname()[1]}")
+        monkeypatch.setenv("OBJECT_STORAGE_SECURE", "false")
+        monkeypatch.setenv("OBJECT_STORAGE_SPOOL", "true")
+        monkeypatch.setenv("OBJECT_STORAGE_DEADLINE", "30")
+        report = tmp_path / "previous.html"
+        report.write_text("<html></html>")
+        HTMLMinio(None).spool.enqueue(
+            str(report), {"name": "previous/report.html", "self_contained": True, "index": None}
+        )
+        pytester.makepyfile("def test_pass(): pass")
+        start = time.monotonic()
+        try:
+            result: RunResult = pytester.runpytest_subprocess(
+                "--store-minio", "--html=test_report.html", "--self-contained-html", timeout=30
+            )
+        finally:
+            server.close()
+        assert result.ret == ExitCode.OK
+        assert time.monotonic() - start < 20
+        match = re.search(r"in the background by process (\d+)", result.stdout.str())
+        try:
+            os.kill(int(match.group(1)), signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def test_request_timeout(self, set_env, minio, monkeypatch):
+        monkeypatch.setenv("OBJECT_STORAGE_DEADLINE", "2")
+        backend = HTMLMinio(None)
+        http_client = backend._get_http_client()
+        with mock.patch.object(urllib3.PoolManager, "urlopen") as urlopen:
+            backend._run(lambda: http_client.urlopen("PUT", "https://example.com/key"))
+            http_client.urlopen("PUT", "https://example.com/key")
+        (_, inside), (_, outside) = urlopen.call_args_list
+        # shortened to the deadline of the upload sending the request
+        assert 0 < inside["timeout"].read_timeout <= 2
+        assert outside["timeout"].read_timeout == 300
+
+    def test_failover_slow_endpoint(self, set_env, minio, monkeypatch):
+        monkeypatch.setenv("OBJECT_STORAGE_ENDPOINT", "eu.example.com,us.example.com")
+        monkeypatch.setenv("OBJECT_STORAGE_DEADLINE", "5")
+        monkeypatch.setenv("OBJECT_STORAGE_RETRIES", "100")
+        monkeypatch.setenv("OBJECT_STORAGE_BACKOFF", "0.01")
+        monkeypatch.setattr(HTMLMinio, "_probe", lambda self, endpoint: None)
+        backend = HTMLMinio(None)
+        slow, fast = backend._rank_endpoints()
+        endpoints = []
+
+        def call():
+            endpoints.append(backend.os_endpoint)
+            if backend.os_endpoint == slow:
+                time.sleep(0.1)
+                raise urllib3.exceptions.ReadTimeoutError(None, "/", "read timed out")
+            return "ok"
+
+        assert backend._run(call) == "ok"
+        # failed over at once, not retried on the slow endpoint
+        assert endpoints == [slow, fast]
+
+        backend = HTMLMinio(None)
+        first, _ = backend._rank_endpoints()
+        endpoints.clear()
+        errors = [ServerError("HTTP 503", 503)]
+
+        def call():
+            endpoints.append(backend.os_endpoint)
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        assert backend._run(call) == "ok"
+        # the server errors are retried on the endpoint first
+        assert endpoints == [first, first]
+
+    def test_failover_deadline(self, set_env, minio, monkeypatch):
+        monkeypatch.setenv("OBJECT_STORAGE_ENDPOINT", "eu.example.com,us.example.com")
+        monkeypatch.setenv("OBJECT_STORAGE_DEADLINE", "1")
+        monkeypatch.setenv("OBJECT_STORAGE_RETRIES", "100")
+        monkeypatch.setenv("OBJECT_STORAGE_BACKOFF", "0.01")
+        monkeypatch.setattr(HTMLMinio, "_probe", lambda self, endpoint: None)
+        backend = HTMLMinio(None)
+        backend._get_client()
+        pool = backend.http_client = mock.MagicMock()
+        endpoints = []
+
+        def call():
+            endpoints.append(backend.os_endpoint)
+            time.sleep(0.05)
+            raise ConnectionResetError()
+
+        start = time.monotonic()
+        with pytest.raises((ConnectionResetError, DeadlineExceeded)):
+            backend._run(call)
+        # one deadline for all the endpoints
+        assert time.monotonic() - start < 1.5
+        assert set(endpoints) == {"eu.example.com", "us.example.com"}
+        # left to the uploads still using it
+        pool.clear.assert_not_called()
+        assert backend.http_client is None
@@ -0,0 +1,220 @@
+import json
+import os
+import tracemalloc
+
+from _pytest.pytester import RunResult
+
+import pytest
+
+from unittest import mock
+
+from swiftclient import ClientException
+
+from pytest_html_object_storage.swift import HTMLSwift
+
+
+def run(pytester, *args):
+    return pytester.runpytest_inprocess("--store-swift", *args)
+
+
+def consume(container, obj, contents, content_length=None, chunk_size=None, **kwargs):
+    # read the contents the way swiftclient sends it on the wire
+    if hasattr(contents, "read"):
+        while contents.read(chunk_size):
+            pass
+    return "etag"
+
+
+class TestSwift:
+    def test_nominal(self, pytester, set_swift_env, swift):
+        connection_mock, conn_mock, uuid_mock = swift
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        conn_mock.put_object.side_effect = consume
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        conn_mock.head_container.assert_called_once_with("test")
+        args, kwargs = conn_mock.put_object.call_args
+        assert args == ("test", "anuuid/report.html")
+        assert kwargs["content_length"] == os.path.getsize(
+            pytester.path / "test_report.html"
+        )
+        assert kwargs["content_type"] == "text/html"
+        result.stdout.re_match_lines(
+            [
+                ".*HTML report sent on Swift object storage at https://test.auth-tenantid.storage.gra.cloud.ovh.net/anuuid/report.html.*"
+            ]
+        )
+
+    @pytest.mark.parametrize("part_size", ["1024", "64"])
+    def test_constant_memory(self, tmp_path, set_swift_env, swift, monkeypatch, part_size):
+        connection_mock, conn_mock, uuid_mock = swift
+        monkeypatch.setenv("OBJECT_STORAGE_PART_SIZE", part_size)
+        conn_mock.put_object.side_effect = consume
+
+        report = tmp_path / "report.html"
+        with open(report, "wb") as f:
+            f.truncate(300 * 1024 * 1024)
+
+        html_swift = HTMLSwift(mock.MagicMock())
+        tracemalloc.start()
+        try:
+            html_swift.send_html("anuuid/report.html", str(report))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert conn_mock.put_object.called
+        assert peak < 16 * 1024 * 1024
+
+    def test_token_cache(self, pytester, set_swift_env, swift):
+        connection_mock, conn_mock, uuid_mock = swift
+
+        pytester.makepyfile("def test_pass(): pass")
+        run(pytester, "--html=test_report.html", "--self-contained-html")
+        conn_mock.get_auth.assert_called_once_with()
+        assert connection_mock.call_args.kwargs["preauthtoken"] is None
+
+        run(pytester, "--html=test_report.html", "--self-contained-html")
+        # the second run reuses the cached token instead of authenticating
+        conn_mock.get_auth.assert_called_once_with()
+        assert connection_mock.call_args.kwargs["preauthurl"] == (
+            "https://storage.gra.cloud.ovh.net/v1/AUTH_tenantid"
+        )
+        assert connection_mock.call_args.kwargs["preauthtoken"] == "token"
+
+    def test_rejected_token(self, set_swift_env, swift, monkeypatch):
+        connection_mock, conn_mock, uuid_mock = swift
+        monkeypatch.setenv("OBJECT_STORAGE_BACKOFF", "0")
+        stale = ["https://storage.gra.cloud.ovh.net/v1/AUTH_tenantid", "stale"]
+        HTMLSwift(None).token_cache.set(HTMLSwift(None).token_key, stale)
+
+        def put_object(container, obj, contents, **kwargs):
+            if conn_mock.token == "stale":
+                # swiftclient after a 401 on a body it cannot send again
+                conn_mock.url = conn_mock.token = None
+                raise ClientException(
+                    f"put_object({container!r}, {obj!r}, ...) failure and no "
+                    "ability to reset contents for reupload."
+                )
+
+        conn_mock.put_object.side_effect = put_object
+        html_swift = HTMLSwift(None)
+        html_swift.send_data("anuuid/report.html", b"<html></html>", "text/html")
+        assert conn_mock.put_object.call_count == 2
+        conn_mock.get_auth.assert_called_once_with()
+        # the next runs do not reuse the rejected token
+        assert HTMLSwift(None).auth == [stale[0], "token"]
+
+    def test_request_timeout(self, set_swift_env, swift, monkeypatch):
+        connection_mock, conn_mock, uuid_mock = swift
+        monkeypatch.setenv("OBJECT_STORAGE_DEADLINE", "2")
+        conn_mock.http_conn = (None, mock.MagicMock(requests_args={}))
+        html_swift = HTMLSwift(None)
+
+        def timeout():
+            with html_swift._connection() as conn:
+                return conn.timeout, conn.http_conn[1].requests_args["timeout"]
+
+        # shortened to the deadline of the upload sending the requests
+        inside = html_swift._run(timeout)
+        assert inside[0] == inside[1] and 0 < inside[0] <= 2
+        assert timeout() == (300, 300)
+
+    def test_run_index(self, pytester, set_swift_env, swift, monkeypatch):
+        connection_mock, conn_mock, uuid_mock = swift
+        monkeypatch.setenv("OBJECT_STORAGE_INDEX", "true")
+        stored = {}
+
+        def put_object(container, obj, contents, headers=None, **kwargs):
+            if obj == "index.json":
+                stored["index"] = contents
+            return consume(container, obj, contents, **kwargs)
+
+        def get_object(container, obj):
+            if "index" not in stored:
+                raise ClientException("not found", http_status=404)
+            return {"etag": "etag"}, stored["index"]
+
+        uuid_mock.uuid4.return_value = "anuuid"
+        conn_mock.put_object.side_effect = put_object
+        conn_mock.get_object.side_effect = get_object
+        pytester.makepyfile("def test_pass(): pass")
+        result: RunResult = run(
+            pytester, "--html=test_report.html", "--self-contained-html"
+        )
+        assert result.ret == 0
+        conn_mock.put_object.assert_any_call(
+            "test",
+            "index.json",
+            contents=mock.ANY,
+            content_type="application/json",
+            headers={"If-None-Match": "*"},
+        )
+        # read back to verify the update
+        assert conn_mock.get_object.call_count == 2
+        assert json.loads(stored["index"])["runs"][0]["name"] == "anuuid/report.html"
+        args, kwargs = conn_mock.put_object.call_args
+        assert args == ("test", "index.html")
+
+    def test_gc(self, set_swift_env, swift):
+        connection_mock, conn_mock, uuid_mock = swift
+        conn_mock.get_container.return_value = (
+            {},
+            [
+                {"name": "old/report.html", "last_modified": "2020-01-01T00:00:00.000000"},
+                {"name": "old/report html", "last_modified": "2020-01-01T00:00:00.000000"},
+                {"name": "assets/a.png", "last_modified": "2020-01-01T00:00:00.000000"},
+            ],
+        )
+        conn_mock.post_account.return_value = (
+            {},
+            b'{"Number Deleted": 2, "Number Not Found": 0, "Errors": []}',
+        )
+
+        html_swift = HTMLSwift(mock.MagicMock())
+        assert html_swift.gc(30) == (1, 2)
+        conn_mock.post_account.assert_called_once_with(
+            headers={"Accept": "application/json", "Content-Type": "text/plain"},
+            query_string="bulk-delete",
+            data=b"/test/old/report.html\n/test/old/report%20html",
+        )
+
+    def test_retryable_errors(self):
+        assert HTMLSwift._is_retryable(ConnectionResetError())
+        assert HTMLSwift._is_retryable(ClientException("", http_status=503))
+        assert HTMLSwift._is_retryable(ClientException("", http_status=401))
+        # authentication failure: no status
+        assert not HTMLSwift._is_retryable(ClientException("Unauthorized."))
+        assert not HTMLSwift._is_retryable(FileNotFoundError("report.html"))
+        assert not HTMLSwift._is_retryable(PermissionError("report.html"))
+
+    def test_index_lock(self, set_swift_env, swift, monkeypatch):
+        connection_mock, conn_mock, uuid_mock = swift
+        monkeypatch.setenv("OBJECT_STORAGE_INDEX_PREFIX", "project")
+        locked = [False, True]
+
+        def put_object(container, obj, contents, headers=None, **kwargs):
+            if obj == "project/index.json.lock" and locked.pop():
+                raise ClientException("precondition failed", http_status=412)
+
+        conn_mock.put_object.side_effect = put_object
+        conn_mock.get_object.return_value = (
+            {"etag": "etag"},
+            b'{"runs": [{"name": "anuuid/report.html"}]}',
+        )
+        html_swift = HTMLSwift(mock.MagicMock())
+        html_swift._update_index({"name": "anuuid/report.html"})
+        lock_calls = [
+            call
+            for call in conn_mock.put_object.call_args_list
+            if call.args[1] == "project/index.json.lock"
+        ]
+        assert len(lock_calls) == 2
+        assert lock_calls[0].kwargs["headers"] == {
+            "If-None-Match": "*",
+            "X-Delete-After": 60,
+        }
+        conn_mock.delete_object.assert_called_once_with("test", "project/index.json.lock")
@@ -0,0 +1,93 @@
+from unittest import mock
+
+import pytest
+
+from pytest_html_object_storage.results import (
+    ResultsRecorder,
+    load_results,
+    percentile,
+    read_payload,
+    results_key,
+)
+
+
+def report(nodeid, when="call", outcome="passed", duration=1.0):
+    return mock.MagicMock(
+        spec=["nodeid", "when", "outcome", "passed", "failed", "duration"],
+        nodeid=nodeid,
+        when=when,
+        outcome=outcome,
+        passed=outcome == "passed",
+        failed=outcome == "failed",
+        duration=duration,
+    )
+
+
+def payload(start, reports):
+    recorder = ResultsRecorder()
+    for r in reports:
+        recorder.add(r)
+    return recorder.payload(f"run{start}/report.html", start, 0)
+
+
+def test_results_key():
+    assert results_key("anuuid/report.html") == "anuuid/results.bin.gz"
+    assert results_key("run/node1/report.html") == "run/node1/results.bin.gz"
+
+
+def test_payload():
+    header, columns = read_payload(
+        payload(
+            10,
+            [
+                report("test_a", "setup", duration=0.5),
+                report("test_a", duration=2.0),
+                report("test_b", outcome="failed", duration=3.0),
+            ],
+        )
+    )
+    assert header["name"] == "run10/report.html"
+    assert header["nodeids"] == ["test_a", "test_b"]
+    assert header["phases"] == ["setup", "call"]
+    assert header["outcomes"] == ["passed", "failed"]
+    assert list(columns["test"]) == [0, 0, 1]
+    assert list(columns["phase"]) == [0, 1, 1]
+    assert list(columns["outcome"]) == [0, 0, 1]
+    assert list(columns["duration"]) == [0.5, 2.0, 3.0]
+
+
+def test_load_results():
+    payloads = {
+        # different dictionaries in each run
+        "run2/results.bin.gz": payload(
+            2, [report("test_b", duration=5.0), report("test_a", duration=3.0)]
+        ),
+        "run1/results.bin.gz": payload(1, [report("test_a", duration=1.0)]),
+        "run3/results.bin.gz": payload(
+            3, [report("test_a", outcome="failed", duration=2.0)]
+        ),
+        "broken/results.bin.gz": b"not gzip",
+    }
+
+    table = load_results(sorted(payloads), payloads.__getitem__, 4)
+    assert [run["name"] for run in table.runs] == [
+        "run1/report.html",
+        "run2/report.html",
+        "run3/report.html",
+    ]
+    assert list(table.durations("test_a")) == [1.0, 3.0, 2.0]
+    assert table.trend("test_a") == [(1, 1.0), (2, 3.0), (3, 2.0)]
+    assert table.percentile("test_a", 50) == 2.0
+    assert table.percentile("test_c", 50) is None
+    assert [table.columns["duration"][row] for row in table.rows(outcome="failed")] == [
+        2.0
+    ]
+    assert table.slowest(q=90) == [("test_b", 5.0), ("test_a", pytest.approx(2.8))]
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 0) == 1.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([4.0, 1.0, 3.0, 2.0], 100) == 4.0
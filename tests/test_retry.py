@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from unittest import mock
+
+from pytest_html_object_storage.retry import DeadlineExceeded, UploadPolicy, remaining
+
+
+def policy(**kwargs):
+    options = dict(deadline=5, retries=2, backoff=0.01)
+    options.update(kwargs)
+    return UploadPolicy(lambda e: isinstance(e, OSError), "endpoint", **options)
+
+
+def test_retry():
+    call = mock.MagicMock(side_effect=[OSError("reset"), OSError("reset"), "ok"])
+    assert policy().run(call) == "ok"
+    assert call.call_count == 3
+
+
+def test_retries_exhausted():
+    call = mock.MagicMock(side_effect=OSError("reset"))
+    with pytest.raises(OSError):
+        policy().run(call)
+    assert call.call_count == 3
+
+
+def test_not_retryable():
+    call = mock.MagicMock(side_effect=ValueError("bad request"))
+    with pytest.raises(ValueError):
+        policy().run(call)
+    assert call.call_count == 1
+
+
+def test_deadline():
+    released = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        policy(deadline=1).run(lambda: released.wait(10))
+    released.set()
+    assert time.monotonic() - start < 5
+
+
+def test_remaining():
+    assert remaining(300) == 300
+    # the request timeouts of an upload end by its deadline
+    assert 0 < policy(deadline=2).run(lambda: remaining(300)) <= 2
+    assert policy(deadline=0).run(lambda: remaining(300)) == 300
+
+
+def test_hedge():
+    calls = []
+
+    def call():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(2)
+            return "slow"
+        return "fast"
+
+    upload_policy = policy(hedge_percentile=95, hedge_max_size=1024)
+    for _ in range(10):
+        upload_policy._record(0.1)
+    assert upload_policy.run(call, 10, hedge=True) == "fast"
+    assert len(calls) == 2
+
+
+def test_no_hedge_for_big_objects():
+    upload_policy = policy(hedge_percentile=95, hedge_max_size=1024)
+    for _ in range(10):
+        upload_policy._record(0.01)
+    call = mock.MagicMock(side_effect=lambda: time.sleep(0.1) or "ok")
+    assert upload_policy.run(call, 2048, hedge=True) == "ok"
+    assert call.call_count == 1
+
+
+def test_hedge_opt_in():
+    upload_policy = policy(hedge_percentile=95, hedge_max_size=1024)
+    for _ in range(10):
+        upload_policy._record(0.01)
+    call = mock.MagicMock(side_effect=lambda: time.sleep(0.1) or "ok")
+    assert upload_policy.run(call) == "ok"
+    assert call.call_count == 1
+    # listings and index updates do not skew the percentile
+    assert len(upload_policy.latencies.get("endpoint")) == 10
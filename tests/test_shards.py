@@ -0,0 +1,71 @@
+import gzip
+import json
+from unittest import mock
+
+from pytest_html_object_storage.shards import (
+    merge_payloads,
+    merge_run,
+    render_merged,
+    shard_key,
+    shard_payload,
+)
+
+
+def result(nodeid, outcome):
+    return {"nodeid": nodeid, "outcome": outcome, "duration": 0.1, "longrepr": None}
+
+
+def payload(shard, *results):
+    outcomes = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    return shard_payload(shard, f"run/{shard}/report.html", 0, outcomes, list(results))
+
+
+def test_shard_payload():
+    assert shard_key("run", "node1") == "run/shards/node1.json.gz"
+    data = json.loads(gzip.decompress(payload("node1", result("t::a", "passed"))))
+    assert data["shard"] == "node1"
+    assert data["outcomes"] == {"passed": 1}
+
+
+def test_merge_payloads():
+    merged = merge_payloads(
+        "run",
+        [
+            json.loads(gzip.decompress(payload("node2", result("t::b", "passed"), result("t::c", "failed")))),
+            json.loads(gzip.decompress(payload("node1", result("t::a", "passed")))),
+        ],
+    )
+    assert [shard["shard"] for shard in merged["shards"]] == ["node1", "node2"]
+    assert merged["shards"][0]["report"] == "node1/report.html"
+    assert merged["outcomes"] == {"passed": 2, "failed": 1}
+    # failures first
+    assert [(r["nodeid"], r["shard"]) for r in merged["results"]] == [
+        ("t::c", "node2"),
+        ("t::a", "node1"),
+        ("t::b", "node2"),
+    ]
+
+
+def test_render_merged_escapes_results():
+    merged = merge_payloads(
+        "run",
+        [json.loads(gzip.decompress(payload("node1", result("t::</script>", "failed"))))],
+    )
+    page = render_merged(merged)
+    assert "<title>Test run run</title>" in page
+    assert "t::<\\/script>" in page
+    assert page.count("</script>") == 2
+
+
+def test_merge_run():
+    stored = {
+        "run/shards/node1.json.gz": payload("node1", result("t::a", "passed")),
+        "run/shards/node2.json.gz": payload("node2", result("t::b", "error")),
+    }
+    send_data = mock.MagicMock()
+    assert merge_run("run", lambda prefix: list(stored), stored.get, send_data, 2) == 2
+    (key, data, content_type), _ = send_data.call_args
+    assert (key, content_type) == ("run/report.html", "text/html")
+    assert b'"outcomes":{"passed":1,"error":1}' in data
@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+from pytest_html_object_storage.spool import STAGING, STAGING_TTL, Spool
+
+
+def test_enqueue(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "style.css").write_text("body {}")
+    report = tmp_path / "report.html"
+    report.write_text("<html></html>")
+    spool = Spool(str(tmp_path / "spool"), "minio endpoint bucket")
+
+    first = spool.enqueue(str(report), {"name": "a/report.html"}, assets=True)
+    second = spool.enqueue(str(report), {"name": "b/report.html"})
+    assert spool.entries() == [first, second]
+    assert sorted(os.listdir(first)) == ["assets", "meta.json", "report.html"]
+    assert sorted(os.listdir(second)) == ["meta.json", "report.html"]
+    with open(os.path.join(first, "meta.json")) as f:
+        assert json.load(f) == {"name": "a/report.html"}
+    # one queue per storage
+    assert Spool(str(tmp_path / "spool"), "minio endpoint other").entries() == []
+
+
+def test_flush(tmp_path):
+    report = tmp_path / "report.html"
+    report.write_text("<html></html>")
+    spool = Spool(str(tmp_path / "spool"), "minio endpoint bucket")
+    for name in ("a", "b", "c"):
+        spool.enqueue(str(report), {"name": name})
+    sent = []
+
+    def send(path, meta):
+        if meta["name"] == "b":
+            raise OSError("unreachable")
+        with open(path) as f:
+            sent.append((meta["name"], f.read()))
+
+    assert spool.flush(send, 2) == (2, 1)
+    assert sorted(sent) == [("a", "<html></html>"), ("c", "<html></html>")]
+    # the failed entry is kept for the next flush
+    (entry,) = spool.entries()
+    assert spool.flush(lambda path, meta: None, 2) == (1, 0)
+    assert not os.path.exists(entry)
+    assert spool.flush(send, 2) == (0, 0)
+
+
+def test_concurrent_flush(tmp_path):
+    report = tmp_path / "report.html"
+    report.write_text("<html></html>")
+    spool = Spool(str(tmp_path / "spool"), "minio endpoint bucket")
+    spool.enqueue(str(report), {"name": "a"})
+    sending = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def slow_send(path, meta):
+        sending.set()
+        release.wait(5)
+        sent.append(meta["name"])
+
+    flush = threading.Thread(target=spool.flush, args=(slow_send, 1))
+    flush.start()
+    sending.wait(5)
+    # the entry being flushed is skipped
+    assert spool.flush(lambda path, meta: sent.append(meta["name"]), 1) == (0, 0)
+    release.set()
+    flush.join()
+    assert sent == ["a"]
+    assert spool.entries() == []
+
+
+def test_stale_staging(tmp_path):
+    spool = Spool(str(tmp_path / "spool"), "minio endpoint bucket")
+    stale = os.path.join(spool.directory, ".staging-stale")
+    recent = os.path.join(spool.directory, ".staging-recent")
+    os.makedirs(stale)
+    os.makedirs(recent)
+    old = time.time() - STAGING_TTL - 1
+    os.utime(stale, (old, old))
+
+    assert spool.entries() == []
+    spool.flush(lambda path, meta: None, 1)
+    assert not os.path.exists(stale)
+    assert os.path.exists(recent)
+
+
+def test_interrupted_removal(tmp_path, monkeypatch):
+    report = tmp_path / "report.html"
+    report.write_text("<html></html>")
+    spool = Spool(str(tmp_path / "spool"), "minio endpoint bucket")
+    entry = spool.enqueue(str(report), {"name": "a"})
+    # killed while removing the sent entry
+    monkeypatch.setattr(shutil, "rmtree", lambda path, ignore_errors=False: None)
+
+    assert spool.flush(lambda path, meta: None, 1) == (1, 0)
+    assert spool.entries() == []
+    assert os.listdir(spool.directory) == [STAGING + os.path.basename(entry)]